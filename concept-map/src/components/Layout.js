@@ -5,9 +5,11 @@ import TextArea from "./TextArea";
 
 const Layout = () => {
   const [graph, setGraoh] = useState("");
+  const [graphId, setGraphId] = useState(null);
 
-  const handleGraph = (g) => {
+  const handleGraph = (g, id) => {
     setGraoh(g);
+    setGraphId(id);
   };
 
   return (
@@ -16,7 +18,7 @@ const Layout = () => {
         <Flow graph={graph} />
       </Box>
       <Box sx={{ width: "20%", height: "100%" }}>
-        <TextArea handleGraph={handleGraph} />
+        <TextArea handleGraph={handleGraph} graphId={graphId} />
       </Box>
     </Box>
   );
@@ -15,7 +15,11 @@ const VisuallyHiddenInput = styled("input")({
   width: 1,
 });
 
-const TextArea = ({ handleGraph }) => {
+// Whether text-only submissions are streamed from /stream-text, which resolves coreferences
+// a few sentences at a time, instead of being sent whole to /send-data
+const STREAM_TEXT = process.env.REACT_APP_STREAM_TEXT === "true";
+
+const TextArea = ({ handleGraph, graphId }) => {
   const [text, setText] = useState("");
   const [file, setFile] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
@@ -37,8 +41,8 @@ const TextArea = ({ handleGraph }) => {
     setFile(uploadedFile);
   };
 
-  const setGraph = (g) => {
-    handleGraph(g);
+  const setGraph = (g, id) => {
+    handleGraph(g, id);
   };
 
   const handleSubmit = async () => {
@@ -49,38 +53,11 @@ const TextArea = ({ handleGraph }) => {
 
     setIsLoading(true);
     try {
-      // Prepare the form data
-      const formData = new FormData();
-      formData.append("text", text);
-      if (file) {
-        formData.append("file", file);
-      }
-
-      // Send the request to the backend
-      const response = await fetch("http://127.0.0.1:5000/send-data", {
-        mode: "cors",
-        method: "POST",
-        body: formData,
-      });
-
-      // Check if the response is successful
-      if (!response.ok) {
-        const errorMessage = `Error: ${response.status} ${response.statusText}`;
-        alert(errorMessage);
-        return;
-      }
-
-      // Parse the response JSON
-      const result = await response.json();
-
-      // Extract the "graph" value from the response and pass it to setGraph
-      if (result.success && result.graph) {
-        setGraph(result.graph);
+      if (STREAM_TEXT && !file) {
+        await streamText();
       } else {
-        alert("Unexpected response format or missing graph data.");
+        await submitData();
       }
-
-      // Clear the file input
     } catch (error) {
       // Handle any errors that occur during the fetch
       console.error("Error submitting data:", error);
@@ -90,6 +67,85 @@ const TextArea = ({ handleGraph }) => {
     }
   };
 
+  const submitData = async () => {
+    // Prepare the form data
+    const formData = new FormData();
+    formData.append("text", text);
+    if (file) {
+      formData.append("file", file);
+    }
+    // Reuse the positions of the previous graph so that nodes keep their place
+    if (graphId) {
+      formData.append("graph_id", graphId);
+    }
+
+    // Send the request to the backend
+    const response = await fetch("http://127.0.0.1:5000/send-data", {
+      mode: "cors",
+      method: "POST",
+      body: formData,
+    });
+
+    // Check if the response is successful
+    if (!response.ok) {
+      const errorMessage = `Error: ${response.status} ${response.statusText}`;
+      alert(errorMessage);
+      return;
+    }
+
+    // Parse the response JSON
+    const result = await response.json();
+
+    // Extract the "graph" value from the response and pass it to setGraph
+    if (result.success && result.graph) {
+      setGraph(result.graph, result.graph_id);
+    } else {
+      alert("Unexpected response format or missing graph data.");
+    }
+  };
+
+  const streamText = async () => {
+    // Stream the graph, which is shown as it grows
+    const response = await fetch("http://127.0.0.1:5000/stream-text", {
+      mode: "cors",
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ text, graph_id: graphId }),
+    });
+
+    // Check if the response is successful
+    if (!response.ok) {
+      const errorMessage = `Error: ${response.status} ${response.statusText}`;
+      alert(errorMessage);
+      return;
+    }
+
+    // Read the response one line (one JSON event) at a time
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      for (const line of lines.filter((line) => line.trim())) {
+        const event = JSON.parse(line);
+        if (event.type === "layout") {
+          // Show the provisional graph, without an id since it is not kept by the backend
+          setGraph(event.graph, graphId);
+        } else if (event.type === "graph") {
+          setGraph(event.graph, event.graph_id);
+        } else if (event.type === "error") {
+          alert(`Error: ${event.error}`);
+        }
+      }
+    }
+  };
+
   return (
     <Box
       sx={{
@@ -0,0 +1,169 @@
+# For guarding the counters of the gate
+import threading
+
+# For counting the pages of uploaded PDF files
+import fitz
+
+class AdmissionError(Exception):
+    """
+    Raised when a request is refused before any work is done.
+    """
+
+    def __init__(self, message, status, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class ConcurrencyGate:
+    """
+    Bounds the number of requests doing work at the same time, overall and per client.
+
+    A request waits at most queue_timeout seconds for a free slot, so that
+    bursts are refused early instead of queueing until they time out.
+    """
+
+    def __init__(self, max_concurrent=4, max_per_client=2, queue_timeout=0, retry_after=5):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._clients = {}
+        self._condition = threading.Condition()
+
+    def acquire(self, client):
+        """
+        Take a slot for a request of a client.
+
+        Args:
+            client (str): The id of the client, e.g. its address.
+
+        Raises:
+            AdmissionError: With status 429 if the client still used all its slots after waiting,
+                            or 503 if no slot became free in time.
+        """
+        with self._condition:
+            # Requests of a client queued together must not take more than its slots once they free up
+            admitted = lambda: self.active < self.max_concurrent and self._clients.get(client, 0) < self.max_per_client
+            if not self._condition.wait_for(admitted, timeout=self.queue_timeout):
+                if self._clients.get(client, 0) >= self.max_per_client:
+                    raise AdmissionError('Too many concurrent requests from this client', 429, self.retry_after)
+                raise AdmissionError('The server is busy', 503, self.retry_after)
+            self.active += 1
+            self._clients[client] = self._clients.get(client, 0) + 1
+
+    def release(self, client):
+        """
+        Free the slot of a request of a client.
+
+        Args:
+            client (str): The id of the client.
+        """
+        with self._condition:
+            self.active -= 1
+            self._clients[client] -= 1
+            if not self._clients[client]:
+                del self._clients[client]
+            # Waiting requests of other clients cannot use a slot freed by this client, so all of them check again
+            self._condition.notify_all()
+
+def check_text(text, max_length):
+    """
+    Check the length of an input text.
+
+    Args:
+        text (str): The input text.
+        max_length (int): Maximum number of characters, or None for no limit.
+
+    Raises:
+        AdmissionError: With status 413 if the text is too long.
+    """
+    if max_length and text and len(text) > max_length:
+        raise AdmissionError(f'The text is longer than {max_length} characters', 413)
+
+def check_pdf(pdf_bytes, max_pages):
+    """
+    Check the number of pages of an uploaded PDF file.
+
+    Args:
+        pdf_bytes (bytes): Content of the PDF file.
+        max_pages (int): Maximum number of pages, or None for no limit.
+
+    Raises:
+        AdmissionError: With status 400 if the file is not a PDF, or 413 if it has too many pages.
+    """
+    if not max_pages or not pdf_bytes:
+        return
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+    except Exception:
+        raise AdmissionError('The file is not a valid PDF', 400)
+    pages = len(doc)
+    doc.close()
+    if pages > max_pages:
+        raise AdmissionError(f'The PDF file has more than {max_pages} pages', 413)
+
+def init_app(app, gate, endpoints, gated):
+    """
+    Check the limits of a Flask app's requests and gate their concurrency.
+
+    The size of the body is limited by the MAX_CONTENT_LENGTH setting of Flask,
+    the length of the text by MAX_TEXT_LENGTH and the pages of the PDF file by
+    MAX_PDF_PAGES. Clients are told apart by the CLIENT_ID_HEADER header if
+    set, and by their address otherwise.
+
+    Args:
+        app (Flask): The app.
+        gate (ConcurrencyGate): The gate of the expensive endpoints.
+        endpoints (set): Names of the endpoints whose input is checked.
+        gated (set): Names of the endpoints which also need a slot of the gate.
+    """
+    from flask import g, jsonify, request
+
+    @app.errorhandler(AdmissionError)
+    def refuse(error):
+        response = jsonify({"error": str(error)})
+        response.status_code = error.status
+        if error.retry_after is not None:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    @app.before_request
+    def admit():
+        if request.endpoint not in endpoints:
+            return
+        # Reading the body raises a 413 error when it is larger than MAX_CONTENT_LENGTH
+        data = request.get_json(silent=True) if request.is_json else request.form
+        if not isinstance(data, dict):
+            raise AdmissionError('The body must be a JSON object', 400)
+        texts = data.get('texts') if isinstance(data.get('texts'), list) else [data.get('text')]
+        for text in texts:
+            check_text(text if isinstance(text, str) else None, app.config.get('MAX_TEXT_LENGTH'))
+        file = request.files.get('file')
+        if file:
+            check_pdf(file.read(), app.config.get('MAX_PDF_PAGES'))
+            file.seek(0)
+        if request.endpoint not in gated:
+            return
+        header = app.config.get('CLIENT_ID_HEADER')
+        client = (request.headers.get(header) if header else None) or request.remote_addr or 'unknown'
+        gate.acquire(client)
+        g.admitted_client = client
+
+    @app.after_request
+    def release_streamed(response):
+        # Streamed responses keep working after the view returns, so their slot is freed when they end
+        client = g.pop('admitted_client', None)
+        if client is not None:
+            if response.is_streamed:
+                response.call_on_close(lambda: gate.release(client))
+            else:
+                gate.release(client)
+        return response
+
+    @app.teardown_request
+    def release(exception):
+        # Requests which failed before after_request still hold their slot
+        client = g.pop('admitted_client', None)
+        if client is not None:
+            gate.release(client)
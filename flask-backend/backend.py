@@ -1,30 +1,203 @@
 # For file and directory operations
 import os
+# For serializing job events
+import json
+# For polling job progress
+import time
+# For validating corpus names
+import re
+# For bounding the number of job event streams
+import threading
 
 # Flask framework for building the backend
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 # To handle Cross-Origin Resource Sharing (CORS)
 from flask_cors import CORS
 
-# Handles processing the text amd extracting (concept -> relation -> concept) pairs
-from logic import coreference_resolution, find_concept_link_concept_pairs
-# Handles generating the graph layout (the coordinates of the nodes and edges)
-from graph import generate_layout
-# Handles extracting additional information from the PDF for an improved graph
-from ranking import extract_text_from_pdf, rank_abstract_concepts, rank_tokens, filter_concept_map
+# Reports whether the spacy model is loaded
+from models import is_loaded
+# Handles processing many texts at once
+from logic import find_concept_link_concept_pairs_batch, DEFAULT_BATCH_SIZE
+# Runs the cached pipeline from the input text (and PDF) to the graph layout
+from pipeline import (generate_concept_graph, build_concept_map, stream_concept_graph, layout_graph, get_graph,
+                      extract_pdf_concept_map, result_cache, is_warm, DEFAULT_TOP_N)
+# Concept maps merged from many documents
+from corpus import CorpusStore
+# For deriving document ids from their content
+from cache import make_key
+# Saves generated graphs and queries parts of them
+from store import GraphStore
+# Reads the node positions of a previous graph
+from graph import get_positions
+# Runs pipeline jobs in the background on a pool of worker processes
+from jobs import JobManager, QueueFull, FINISHED
+# Times every request and its pipeline stages, and serves the metrics
+import instrumentation
+# Encodes graphs in the wire format negotiated with the client
+import wire
+# Limits the size and concurrency of the requests
+import admission
 
 # Initialize the Flask app
 app = Flask(__name__)
 # Enable CORS for the app
 CORS(app)
+# Report the stage timings of every request in a Server-Timing header, and serve /metrics.
+# Requests slower than SLOW_REQUEST_SECONDS are profiled and logged
+instrumentation.init_app(
+    app,
+    trace_memory=os.environ.get('TRACE_MEMORY', '') == '1',
+    slow_request_seconds=float(os.environ.get('SLOW_REQUEST_SECONDS', 0)),
+)
 
-# Define the folder where uploaded files will be stored
-UPLOAD_FOLDER = 'uploads'
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Limits of the input of the pipeline endpoints. Larger requests are refused with a 413 error
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024)) or None
+app.config['MAX_TEXT_LENGTH'] = int(os.environ.get('MAX_TEXT_LENGTH', 1000000)) or None
+app.config['MAX_PDF_PAGES'] = int(os.environ.get('MAX_PDF_PAGES', 500)) or None
+# Header identifying the clients behind a proxy, instead of their address
+app.config['CLIENT_ID_HEADER'] = os.environ.get('CLIENT_ID_HEADER') or None
+# Requests beyond MAX_CONCURRENT_REQUESTS wait up to ADMISSION_QUEUE_TIMEOUT seconds for a slot and are then
+# refused with a 503 error, and clients with MAX_REQUESTS_PER_CLIENT requests running are refused with a 429 error.
+# The limits are per process. The pipeline holds the GIL, so one slot keeps a process busy, and
+# gunicorn.conf.py gives every worker a few more threads than slots to refuse the other requests
+admission_gate = admission.ConcurrencyGate(
+    max_concurrent=int(os.environ.get('MAX_CONCURRENT_REQUESTS', 1)),
+    max_per_client=int(os.environ.get('MAX_REQUESTS_PER_CLIENT', 2)),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 1)),
+    retry_after=int(os.environ.get('RETRY_AFTER_SECONDS', 5)),
+)
+admission.init_app(
+    app,
+    admission_gate,
+    endpoints={'receive_data', 'receive_text', 'stream_text', 'receive_batch', 'add_corpus_document', 'submit_job'},
+    # Jobs have their own bounded queue
+    gated={'receive_data', 'receive_text', 'stream_text', 'receive_batch', 'add_corpus_document'},
+)
 
-# Create the upload folder if it doesn't exist
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Maximum number of processes a batch request may use
+app.config['BATCH_MAX_PROCESSES'] = int(os.environ.get('BATCH_MAX_PROCESSES', os.cpu_count() or 1))
+
+def parse_bool(value):
+    """
+    Parse a boolean option given as JSON or as a form field.
+
+    Args:
+        value: The option value, e.g. True, 'true' or '1'.
+
+    Returns:
+        bool: The parsed value.
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+def get_layout_options(data):
+    """
+    Read the graph layout options of a request.
+
+    Args:
+        data (dict): The JSON body or the form of the request.
+
+    Returns:
+        dict: Keyword arguments for generate_layout.
+    """
+    iterations = data.get('iterations')
+    time_budget = data.get('time_budget')
+    # A previous graph, given by id or in full, is used to warm-start the layout
+    previous_graph = get_graph(data['graph_id']) if data.get('graph_id') else data.get('previous_graph')
+    if isinstance(previous_graph, str):
+        previous_graph = json.loads(previous_graph)
+    return {
+        'directed': parse_bool(data.get('directed', False)),
+        'multi': parse_bool(data.get('multi', False)),
+        'algorithm': data.get('layout', 'spring'),
+        'iterations': int(iterations) if iterations else None,
+        'time_budget': float(time_budget) if time_budget else None,
+        'pack': parse_bool(data.get('pack', False)),
+        'previous_positions': get_positions(previous_graph) if previous_graph else None,
+        'warm_start': data.get('warm_start', 'fixed'),
+    }
+
+def graph_response(body, status=200):
+    """
+    Send a response body containing graphs in the format negotiated with the client.
+
+    The React Flow JSON is sent unless the Accept header asks for a compact
+    format (see wire.py), and the body is compressed if Accept-Encoding allows it.
+
+    Args:
+        body (dict): The response body.
+        status (int): The status code.
+
+    Returns:
+        Response: The response.
+    """
+    media_type = request.accept_mimetypes.best_match(wire.media_types(), default=wire.JSON)
+    encoding = request.accept_encodings.best_match(wire.encodings())
+    data, headers = wire.encode(body, media_type, encoding)
+    return Response(data, status=status, headers=headers)
+
+def get_filter_options(data):
+    """
+    Read the options of a request for filtering the concept map with a PDF file.
+
+    Args:
+        data (dict): The JSON body or the form of the request.
+
+    Returns:
+        dict: Keyword arguments for build_concept_map.
+    """
+    top_n = data.get('top_n')
+    min_score = data.get('min_score')
+    return {
+        'prune': parse_bool(data.get('prune', False)),
+        'top_n': int(top_n) if top_n else DEFAULT_TOP_N,
+        'min_score': float(min_score) if min_score else None,
+    }
+
+# Path of the SQLite database of saved graphs, opened on first use
+app.config['GRAPH_STORE'] = os.environ.get('GRAPH_STORE', 'graphs.sqlite3')
+_graph_store = None
+
+def get_graph_store():
+    """
+    Get the store of saved graphs, opening it on first use.
+
+    Returns:
+        GraphStore: The store.
+    """
+    global _graph_store
+    if _graph_store is None:
+        _graph_store = GraphStore(app.config['GRAPH_STORE'])
+    return _graph_store
+
+def graph_body(graph_id, graph, data):
+    """
+    Build the response body of a generated graph, saving the graph if the request asks for it.
+
+    Args:
+        graph_id (str): The id of the graph.
+        graph (dict): The graph.
+        data (dict): The JSON body or the form of the request.
+
+    Returns:
+        dict: The response body, with the id of the saved map if the graph was saved.
+    """
+    body = {"success": True, "graph": graph, "graph_id": graph_id}
+    if parse_bool(data.get('persist', False)):
+        body["map_id"] = get_graph_store().save_graph(graph, graph_id)
+    return body
+
+# Background jobs for the same work as /send-data
+app.config['JOB_MAX_WORKERS'] = int(os.environ.get('JOB_MAX_WORKERS', 2))
+app.config['JOB_MAX_QUEUE'] = int(os.environ.get('JOB_MAX_QUEUE', 16))
+# Database of the job states, shared by every worker so that any of them can report a job
+app.config['JOB_STORE'] = os.environ.get('JOB_STORE', 'jobs.sqlite3')
+job_manager = JobManager(app.config['JOB_STORE'], max_workers=app.config['JOB_MAX_WORKERS'], max_queue=app.config['JOB_MAX_QUEUE'])
+# Job event streams hold a server thread each, so their number and duration are bounded
+app.config['JOB_EVENTS_MAX_STREAMS'] = int(os.environ.get('JOB_EVENTS_MAX_STREAMS', 2))
+app.config['JOB_EVENTS_MAX_SECONDS'] = float(os.environ.get('JOB_EVENTS_MAX_SECONDS', 300))
+job_event_streams = threading.BoundedSemaphore(app.config['JOB_EVENTS_MAX_STREAMS'])
 
 # Endpoint to handle text and file uploads for generating a concept map
 @app.route('/send-data', methods=['POST'])
@@ -34,30 +207,15 @@ def receive_data():
         text = request.form.get('text', '')
         file = request.files.get('file', None)
 
-        concept_map = []
-        if text:
-            # Perform coreference resolution on the input text
-            resolved_text = coreference_resolution(text)
-            # Extract concept map (concept -> relation -> concept) pairs
-            concept_map = find_concept_link_concept_pairs(resolved_text)
-
-        if file:
-            # Save the uploaded file to the upload folder
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-            file.save(file_path)
-            # Extract text from the uploaded PDF file
-            file_text = extract_text_from_pdf(file_path)
-            # Rank tokens extracted from the file text
-            ranked_tokens = rank_tokens(file_text)
-            # Rank abstract concepts based on the resolved text and ranked tokens
-            ranked_abstract_concepts = rank_abstract_concepts(resolved_text, ranked_tokens)
-            # Filter the concept map based on the ranked abstract concepts
-            concept_map = filter_concept_map(concept_map, ranked_abstract_concepts)
-
-        # Generate a graph layout for the concept map
-        graph = generate_layout(concept_map)
-        # Return the graph as a JSON response
-        return jsonify({"success": True, "graph": graph}), 200
+        # Read the uploaded file from its in-memory or spooled buffer, without saving it
+        pdf_bytes = file.read() if file else None
+
+        # Generate a graph layout for the concept map of the text, filtered using the file
+        incremental = parse_bool(request.form.get('incremental', False))
+        graph_id, graph = generate_concept_graph(text, pdf_bytes, layout_options=get_layout_options(request.form), incremental=incremental,
+                                                 filter_options=get_filter_options(request.form))
+        # Return the graph in the format negotiated with the client
+        return graph_response(graph_body(graph_id, graph, request.form))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -68,18 +226,255 @@ def receive_text():
         # Retrieve JSON data from the request
         data = request.json
         text = data.get('text', '')
-        # Perform coreference resolution on the input text
-        resolved_text = coreference_resolution(text)
-        # Extract concept map (concept -> relation -> concept) pairs
-        concept_map = find_concept_link_concept_pairs(resolved_text)
-        # Generate a graph layout from the concept map
-        graph = generate_layout(concept_map)
-        # Return the graph as a JSON response
-        return jsonify({"success": True, "graph": graph}), 200
+        # Generate a graph layout from the concept map of the text
+        incremental = parse_bool(data.get('incremental', False))
+        graph_id, graph = generate_concept_graph(text, layout_options=get_layout_options(data), incremental=incremental)
+        # Return the graph in the format negotiated with the client
+        return graph_response(graph_body(graph_id, graph, data))
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Endpoint to stream the triples and provisional layouts of a text as they are found, as NDJSON
+@app.route('/stream-text', methods=['POST'])
+def stream_text():
+    try:
+        # Retrieve JSON data from the request
+        data = request.json
+        text = data.get('text', '')
+        layout_options = get_layout_options(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    def events():
+        try:
+            for event in stream_concept_graph(text, layout_options):
+                yield json.dumps(event) + '\n'
+        except Exception as e:
+            # The status has already been sent, so errors are reported as an event
+            yield json.dumps({"type": "error", "error": str(e)}) + '\n'
+
+    return Response(events(), mimetype='application/x-ndjson')
+
+# Endpoint to handle many texts at once, returning one concept map per text
+@app.route('/send-batch', methods=['POST'])
+def receive_batch():
+    try:
+        # Retrieve JSON data from the request
+        data = request.json
+        texts = data.get('texts', [])
+        if not isinstance(texts, list):
+            return jsonify({"error": "texts must be a list"}), 400
+        batch_size = int(data.get('batch_size', DEFAULT_BATCH_SIZE))
+        n_process = min(int(data.get('n_process', 1)), app.config['BATCH_MAX_PROCESSES'])
+        # Resolve coreferences and extract the concept maps of all texts
+        concept_maps = find_concept_link_concept_pairs_batch(texts, batch_size=batch_size, n_process=n_process)
+        # Generate a graph layout for every concept map
+        layout_options = get_layout_options(data)
+        results = [layout_graph(concept_map, layout_options) for concept_map in concept_maps]
+        # Return the graphs, in the order of the input texts, in the negotiated format
+        return graph_response({"success": True, "graphs": [graph for _, graph in results], "graph_ids": [graph_id for graph_id, _ in results]})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Corpora of documents, saved to CORPUS_DIR if set so that every worker sees them
+corpus_store = CorpusStore(os.environ.get('CORPUS_DIR') or None)
+# Allowed corpus names
+CORPUS_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Endpoint to add a document (text and/or PDF file) to a corpus, creating the corpus if needed
+@app.route('/corpus/<name>/documents', methods=['POST'])
+def add_corpus_document(name):
+    if not CORPUS_NAME.match(name):
+        return jsonify({"error": "Invalid corpus name"}), 400
+    try:
+        # Retrieve text and file from the request
+        text = request.form.get('text', '')
+        file = request.files.get('file', None)
+        pdf_bytes = file.read() if file else None
+        if not text and not pdf_bytes:
+            return jsonify({"error": "No text or file"}), 400
+        # Documents are identified by their content unless an id is given, so adding one again replaces it
+        doc_id = request.form.get('doc_id') or make_key('document', text, pdf_bytes or b'')
+        # Without text, the concept map is extracted from the whole PDF file
+        if text:
+            concept_map = build_concept_map(text, pdf_bytes, **get_filter_options(request.form))
+        else:
+            concept_map = extract_pdf_concept_map(pdf_bytes)
+        merged = corpus_store.add_document(name, doc_id, concept_map)
+        return jsonify({"success": True, "doc_id": doc_id, "triples": merged}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint to remove a document from a corpus
+@app.route('/corpus/<name>/documents/<doc_id>', methods=['DELETE'])
+def remove_corpus_document(name, doc_id):
+    if not CORPUS_NAME.match(name) or not corpus_store.remove_document(name, doc_id):
+        return jsonify({"error": "Unknown corpus or document"}), 404
+    return jsonify({"success": True}), 200
+
+# Endpoint to get the merged concept map of a corpus, with the support of every edge
+@app.route('/corpus/<name>', methods=['GET'])
+def get_corpus(name):
+    corpus = corpus_store.get(name) if CORPUS_NAME.match(name) else None
+    if corpus is None:
+        return jsonify({"error": "Unknown corpus"}), 404
+    try:
+        min_support = int(request.args.get('min_support', 1))
+        graph_id, graph = layout_graph(corpus.concept_map(min_support), get_layout_options(request.args))
+        return graph_response(dict(corpus.summary(min_support), success=True, graph=graph, graph_id=graph_id))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint to get the description of a saved graph
+@app.route('/maps/<int:map_id>', methods=['GET'])
+def get_map(map_id):
+    description = get_graph_store().get_map(map_id)
+    if description is None:
+        return jsonify({"error": "Unknown map"}), 404
+    return jsonify(description), 200
+
+# Endpoint to delete a saved graph
+@app.route('/maps/<int:map_id>', methods=['DELETE'])
+def delete_map(map_id):
+    if not get_graph_store().delete_map(map_id):
+        return jsonify({"error": "Unknown map"}), 404
+    return jsonify({"success": True}), 200
+
+# Endpoint to list the nodes of a saved graph, one page at a time
+@app.route('/maps/<int:map_id>/nodes', methods=['GET'])
+def get_map_nodes(map_id):
+    description = get_graph_store().get_map(map_id)
+    if description is None:
+        return jsonify({"error": "Unknown map"}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 10000)
+    nodes = get_graph_store().nodes(map_id, offset, limit)
+    return jsonify({"nodes": nodes, "offset": offset, "limit": limit, "total": description['node_count']}), 200
+
+# Endpoint to list the edges of a saved graph, one page at a time, optionally only those of a relation
+@app.route('/maps/<int:map_id>/edges', methods=['GET'])
+def get_map_edges(map_id):
+    description = get_graph_store().get_map(map_id)
+    if description is None:
+        return jsonify({"error": "Unknown map"}), 404
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 10000)
+    edges = get_graph_store().edges(map_id, offset, limit, request.args.get('relation'))
+    return jsonify({"edges": edges, "offset": offset, "limit": limit, "total": description['edge_count']}), 200
+
+# Endpoint to list the nodes of a saved graph with the most edges
+@app.route('/maps/<int:map_id>/top-nodes', methods=['GET'])
+def get_map_top_nodes(map_id):
+    if get_graph_store().get_map(map_id) is None:
+        return jsonify({"error": "Unknown map"}), 404
+    limit = min(request.args.get('limit', 20, type=int), 10000)
+    return jsonify({"nodes": get_graph_store().top_nodes(map_id, limit)}), 200
+
+# Endpoint to get the part of a saved graph within some hops of a concept
+@app.route('/maps/<int:map_id>/neighbourhood', methods=['GET'])
+def get_map_neighbourhood(map_id):
+    concept = request.args.get('concept')
+    if not concept:
+        return jsonify({"error": "No concept"}), 400
+    hops = min(request.args.get('hops', 1, type=int), 10)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    graph = get_graph_store().neighbourhood(map_id, concept, hops, limit)
+    if graph is None:
+        return jsonify({"error": "Unknown map or concept"}), 404
+    return graph_response({"success": True, "graph": graph})
+
+# Endpoint to check that the server is up, without loading any model
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+# Endpoint to check that the models are loaded, so that requests are served without delay. The models
+# are loaded by warm_up under gunicorn, and by the first request otherwise
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = {"model_loaded": is_loaded(), "warm": is_warm()}
+    ready = status["warm"] or status["model_loaded"]
+    return jsonify(dict(status, ready=ready)), 200 if ready else 503
+
+# Endpoint to report the hit and miss counters of the result cache
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats()), 200
+
+# Endpoint to submit the work of /send-data as a background job
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        # Retrieve text and file from the request
+        text = request.form.get('text', '')
+        file = request.files.get('file', None)
+        pdf_bytes = file.read() if file else None
+        # Queue the job and return its id right away
+        incremental = parse_bool(request.form.get('incremental', False))
+        job_id = job_manager.submit(text, pdf_bytes, layout_options=get_layout_options(request.form), incremental=incremental,
+                                    filter_options=get_filter_options(request.form))
+        return jsonify({"success": True, "job_id": job_id}), 202
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Endpoint to poll the progress and result of a job
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = job_manager.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return graph_response(status)
+
+# Endpoint to cancel a job
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not job_manager.cancel(job_id):
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job_manager.status(job_id)), 200
+
+# Endpoint to subscribe to the progress of a job as Server-Sent Events
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if job_manager.status(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    if not job_event_streams.acquire(blocking=False):
+        response = jsonify({"error": "Too many job event streams, poll /jobs/<job_id> instead"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(admission_gate.retry_after)
+        return response
+
+    def events():
+        last = None
+        deadline = time.monotonic() + app.config['JOB_EVENTS_MAX_SECONDS']
+        while True:
+            status = job_manager.status(job_id)
+            # The job expired while the stream was open
+            if status is None:
+                yield f'event: expired\ndata: {json.dumps({"job_id": job_id, "error": "Unknown job"})}\n\n'
+                return
+            # Send an event only when the status or stage changes
+            current = (status['status'], status['stage'])
+            if current != last:
+                yield f'data: {json.dumps(status)}\n\n'
+                last = current
+            if status['status'] in FINISHED:
+                return
+            # The client reconnects to follow the job further
+            if time.monotonic() >= deadline:
+                yield f'event: timeout\ndata: {json.dumps({"job_id": job_id})}\n\n'
+                return
+            time.sleep(0.25)
+
+    response = Response(events(), mimetype='text/event-stream')
+    # The stream's slot is freed when the response is closed, even if it was never read
+    response.call_on_close(job_event_streams.release)
+    return response
+
 """ TO DO
 # Endpoint to handle file-only input for extracting and ranking concepts
 @app.route('/send-file', methods=['POST'])
@@ -92,13 +487,8 @@ def receive_file():
     if file.filename == '':
         return jsonify({"error": "No selected file"}), 400
     if file:
-        # Save the uploaded file to the upload folder
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file.filename)
-        file.save(file_path)
-        # Extract text from the uploaded PDF file
-        text = extract_text_from_pdf(file_path)
-        # Rank concepts extracted from the text
-        ranked_tokens = rank_concepts(text)
+        # Rank tokens extracted from the uploaded PDF file, page by page
+        ranked_tokens = rank_pdf_tokens(file.stream)
         # Return the ranked tokens as a JSON response
         return jsonify(ranked_tokens)
 """
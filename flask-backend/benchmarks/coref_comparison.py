@@ -0,0 +1,82 @@
+"""
+Compare windowed coreference resolution with resolving the whole text at once.
+
+For every document and window configuration, reports the time of both modes,
+the share of sentences resolved to the same text, and the precision and
+recall of the extracted concept map against the whole-text result.
+
+Usage:
+    python benchmarks/coref_comparison.py [paths ...] [--windows 10:2 20:5] [--processes 1]
+
+Without paths, the sample input text of logic.py is used.
+"""
+# For parsing the command line arguments
+import argparse
+# For file and directory operations
+import os
+# For importing the backend modules
+import sys
+# For measuring elapsed time
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic import (input_text, coreference_resolution_windowed, split_sentences, resolve_char_ranges,
+                   parse, find_concept_link_concept_pairs_from_doc)
+from models import get_pipeline
+from ranking import extract_text_from_pdf
+
+def read_document(path):
+    if path.lower().endswith('.pdf'):
+        return extract_text_from_pdf(path)
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def resolve_full(text):
+    # Resolve the whole text at once, keeping the resolved text of every sentence
+    sentences = split_sentences(text)
+    ranges = []
+    offset = 0
+    for sentence in sentences:
+        ranges.append((offset, offset + len(sentence)))
+        offset += len(sentence)
+    return resolve_char_ranges(get_pipeline('coref')(text), ranges)
+
+def precision_recall(found, expected):
+    found, expected = set(found), set(expected)
+    common = len(found & expected)
+    precision = common / len(found) if found else 1.0
+    recall = common / len(expected) if expected else 1.0
+    return precision, recall
+
+def compare(name, text, windows, n_process):
+    start = time.perf_counter()
+    full_sentences = resolve_full(text)
+    full_time = time.perf_counter() - start
+    full_map = find_concept_link_concept_pairs_from_doc(parse(''.join(full_sentences)))
+    print(f'{name}: {len(full_sentences)} sentences, full resolution {full_time:.2f}s, {len(full_map)} triples')
+
+    for window, overlap in windows:
+        start = time.perf_counter()
+        resolved = coreference_resolution_windowed(text, window, overlap, n_process)
+        windowed_time = time.perf_counter() - start
+        # Both resolved texts are split in the same way, so their sentences can be compared one by one
+        same = sum(1 for a, b in zip(split_sentences(resolved), split_sentences(''.join(full_sentences))) if a == b)
+        precision, recall = precision_recall(find_concept_link_concept_pairs_from_doc(parse(resolved)), full_map)
+        print(f'  window={window} overlap={overlap}: {windowed_time:.2f}s ({full_time / max(windowed_time, 1e-9):.1f}x), '
+              f'same sentences {same / max(len(full_sentences), 1):.1%}, triple precision {precision:.1%}, recall {recall:.1%}')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='*', help='PDF or text files to compare on')
+    parser.add_argument('--windows', nargs='+', default=['10:2', '20:5', '40:10'], help='window:overlap configurations')
+    parser.add_argument('--processes', type=int, default=1, help='number of processes resolving windows')
+    args = parser.parse_args()
+
+    windows = [tuple(int(part) for part in config.split(':')) for config in args.windows]
+    documents = [(path, read_document(path)) for path in args.paths] or [('input_text', input_text)]
+    for name, text in documents:
+        compare(name, text, windows, args.processes)
+
+if __name__ == '__main__':
+    main()
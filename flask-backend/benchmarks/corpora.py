@@ -0,0 +1,50 @@
+"""
+Generated texts, PDF files and concept maps for the benchmarks.
+"""
+# For generating corpora
+import random
+
+# For generating PDF files
+import fitz
+
+ADJECTIVES = ['semantic', 'structural', 'lexical', 'external', 'large', 'sparse', 'formal', 'neural']
+NOUNS = ['ontology', 'information', 'matching', 'graph', 'reasoner', 'dictionary', 'similarity',
+         'approach', 'structure', 'analysis', 'category', 'solution', 'result', 'model', 'method']
+VERBS = ['describes', 'improves', 'uses', 'analyzes', 'combines', 'extends', 'is based on', 'relies on']
+
+def generate_sentence(rng, noun_phrases):
+    # A subject and object, each followed by further noun phrases attached with prepositions
+    phrases = [f'the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}' for _ in range(max(2, noun_phrases))]
+    half = len(phrases) // 2
+    subject = ' of '.join(phrases[:half])
+    object_ = ' of '.join(phrases[half:])
+    sentence = f'{subject} {rng.choice(VERBS)} {object_}. '
+    return sentence[0].upper() + sentence[1:]
+
+def generate_text(sentences, noun_phrases=3, seed=0):
+    """
+    Generate a text of sentences with a given number of noun phrases each.
+    """
+    rng = random.Random(seed)
+    return ''.join(generate_sentence(rng, noun_phrases) for _ in range(sentences))
+
+def generate_pdf(pages, sentences_per_page=30, seed=0):
+    """
+    Generate the content of a PDF file with a given number of text pages.
+    """
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = generate_text(sentences_per_page, seed=seed + page_num)
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+def generate_concept_map(nodes, edges_per_node=2, seed=0):
+    """
+    Generate a random concept map with a given number of concepts.
+    """
+    rng = random.Random(seed)
+    concepts = [f'concept {i}' for i in range(nodes)]
+    return [(rng.choice(concepts), rng.choice(VERBS), rng.choice(concepts)) for _ in range(nodes * edges_per_node)]
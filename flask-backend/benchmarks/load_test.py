@@ -0,0 +1,184 @@
+"""
+Load a running server with concurrent requests to /send-text or /send-data.
+
+For every number of concurrent clients, sends requests for a fixed duration
+and reports the throughput, the latency percentiles of the successful
+requests and the number of responses of every status, e.g. 503 and 429
+responses of the admission control. Every request has a different generated
+text, so that results are not served from the cache. Run it once for every
+server setting to compare, e.g. MAX_CONCURRENT_REQUESTS or WEB_CONCURRENCY,
+and label the runs to collect them in one results file. Clients send their
+id in an X-Client-Id header, which the server uses with CLIENT_ID_HEADER=X-Client-Id.
+
+Usage:
+    python benchmarks/load_test.py [--url http://127.0.0.1:5000] [--endpoint send-text] [--concurrency 1 4 16]
+                                   [--duration 30] [--sentences 20] [--pdf-pages 5] [--label name] [--output results.json]
+"""
+# For parsing the command line arguments
+import argparse
+# For the results file
+import json
+# For file and directory operations
+import os
+# For importing the corpus generators
+import sys
+# For running the clients concurrently
+import threading
+# For measuring elapsed time
+import time
+# For sending the requests
+import urllib.error
+import urllib.request
+# For the boundaries of multipart bodies
+import uuid
+# For counting the statuses
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpora import generate_text, generate_pdf
+
+def multipart(fields, files):
+    """
+    Encode form fields and files as a multipart/form-data body.
+
+    Returns:
+        tuple: The body and its content type.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, data, content_type) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+def build_request(url, endpoint, text, pdf_bytes, client_id):
+    # A request for one generated text, identified as coming from one client
+    headers = {'X-Client-Id': client_id}
+    if endpoint == 'send-data':
+        files = {'file': ('paper.pdf', pdf_bytes, 'application/pdf')} if pdf_bytes else {}
+        body, headers['Content-Type'] = multipart({'text': text}, files)
+    else:
+        body = json.dumps({'text': text}).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    return urllib.request.Request(f'{url}/{endpoint}', data=body, headers=headers, method='POST')
+
+def send(request, timeout):
+    """
+    Send a request and wait for the whole response.
+
+    Returns:
+        tuple: The status, or the name of the error without a response, and the latency in seconds.
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+def percentile(values, q):
+    # Nearest-rank percentile of sorted values
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+def run(args, concurrency, pdf_bytes):
+    """
+    Send requests from concurrent clients for the duration of the run.
+
+    Returns:
+        dict: The settings and measurements of the run.
+    """
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    seeds = iter(range(10 ** 9))
+
+    def client(index):
+        # Clients share an id when fairness between a few heavy clients is tested
+        client_id = f'client-{index % args.clients if args.clients else index}'
+        while time.perf_counter() < deadline:
+            with lock:
+                seed = next(seeds)
+            text = generate_text(args.sentences, seed=args.seed + seed)
+            status, latency = send(build_request(args.url, args.endpoint, text, pdf_bytes, client_id), args.timeout)
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(latency)
+            # Refused clients back off like a well-behaved client would
+            if status in (429, 503):
+                time.sleep(args.backoff)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'label': args.label,
+        'endpoint': args.endpoint,
+        'concurrency': concurrency,
+        'sentences': args.sentences,
+        'pdf_pages': args.pdf_pages if args.endpoint == 'send-data' else 0,
+        'duration': elapsed,
+        'requests': sum(statuses.values()),
+        'throughput': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50),
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'statuses': {str(status): n for status, n in sorted(statuses.items(), key=str)},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the server')
+    parser.add_argument('--endpoint', choices=['send-text', 'send-data'], default='send-text', help='endpoint to load')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='numbers of concurrent clients')
+    parser.add_argument('--clients', type=int, default=0, help='number of distinct client ids, 0 for one per connection')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of every run')
+    parser.add_argument('--sentences', type=int, default=20, help='sentences of every generated text')
+    parser.add_argument('--pdf-pages', type=int, default=5, help='pages of the PDF file sent to /send-data, 0 for none')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds before a request is given up')
+    parser.add_argument('--backoff', type=float, default=0.5, help='seconds a refused client waits before its next request')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated texts')
+    parser.add_argument('--label', default='', help='name of the server setting, stored with the results')
+    parser.add_argument('--output', help='JSON file to which the results are appended')
+    args = parser.parse_args()
+
+    pdf_bytes = generate_pdf(args.pdf_pages) if args.endpoint == 'send-data' and args.pdf_pages else None
+
+    results = []
+    print(f'{"clients":>8} {"requests":>9} {"req/s":>8} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9}  statuses')
+    for concurrency in args.concurrency:
+        result = run(args, concurrency, pdf_bytes)
+        results.append(result)
+        print(f'{concurrency:>8} {result["requests"]:>9} {result["throughput"]:>8.2f} {result["p50"] * 1000:>9.0f} '
+              f'{result["p90"] * 1000:>9.0f} {result["p99"] * 1000:>9.0f}  {result["statuses"]}')
+
+    if args.output:
+        previous = []
+        if os.path.exists(args.output):
+            with open(args.output, encoding='utf-8') as f:
+                previous = json.load(f)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(previous + results, f, indent=2)
+        print(f'Results appended to {args.output}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
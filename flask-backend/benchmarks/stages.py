@@ -0,0 +1,172 @@
+"""
+Benchmark every stage of the pipeline and the Flask endpoints.
+
+Each benchmark runs on the sample input text of logic.py and on generated
+corpora of increasing size. The time (the best of a few repeats) and the
+peak memory traced by tracemalloc are compared with a baseline file, and
+the script exits with status 1 when a benchmark got slower or used more
+memory than the baseline allows.
+
+Usage:
+    python benchmarks/stages.py [--update-baseline] [--threshold 0.25] [--only layout]
+"""
+# For parsing the command line arguments
+import argparse
+# For uploading generated PDF files
+import io
+# For reading and writing the baseline
+import json
+# For removing the temporary cache directory on exit
+import atexit
+# For file and directory operations
+import os
+# For removing the temporary cache directory
+import shutil
+# For importing the backend modules
+import sys
+# For the temporary cache directory
+import tempfile
+# For measuring elapsed time
+import time
+# For measuring peak memory
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The cache is cleared before every run, so it must not be the cache of a server sharing CACHE_DIR
+os.environ['CACHE_DIR'] = tempfile.mkdtemp(prefix='benchmark-cache-')
+atexit.register(shutil.rmtree, os.environ['CACHE_DIR'], ignore_errors=True)
+
+from logic import input_text, coreference_resolution, find_concept_link_concept_pairs
+from ranking import extract_text_from_pdf, rank_tokens, rank_abstract_concepts, filter_concept_map
+from graph import generate_layout
+from pipeline import result_cache
+from backend import app
+from corpora import generate_text, generate_pdf, generate_concept_map
+
+# Default location of the stored baseline
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Sizes of the generated corpora
+SENTENCE_COUNTS = [10, 50, 200]
+NOUN_PHRASES_PER_SENTENCE = [2, 6]
+PDF_PAGES = [1, 10, 40]
+GRAPH_NODES = [50, 500, 2000]
+
+def post(client, path, **kwargs):
+    # A failed request would be timed as if it had run the whole pipeline
+    response = client.post(path, **kwargs)
+    assert response.status_code == 200, f'{path} returned {response.status_code}: {response.get_data(as_text=True)[:200]}'
+    return response
+
+def build_benchmarks():
+    """
+    Build the benchmarks, keyed by name.
+
+    Returns:
+        dict: Functions called without arguments, keyed by the name of the benchmark.
+    """
+    client = app.test_client()
+
+    texts = {'sample': input_text}
+    for sentences in SENTENCE_COUNTS:
+        for noun_phrases in NOUN_PHRASES_PER_SENTENCE:
+            texts[f'{sentences}s-{noun_phrases}np'] = generate_text(sentences, noun_phrases)
+    pdfs = {f'{pages}p': generate_pdf(pages) for pages in PDF_PAGES}
+    concept_maps = {f'{nodes}n': generate_concept_map(nodes) for nodes in GRAPH_NODES}
+
+    benchmarks = {}
+    for name, text in texts.items():
+        ranked_tokens = rank_tokens(text)
+        ranked_concepts = rank_abstract_concepts(text, ranked_tokens)
+        concept_map = find_concept_link_concept_pairs(text)
+        benchmarks[f'coreference_resolution/{name}'] = lambda text=text: coreference_resolution(text)
+        benchmarks[f'find_concept_link_concept_pairs/{name}'] = lambda text=text: find_concept_link_concept_pairs(text)
+        benchmarks[f'rank_tokens/{name}'] = lambda text=text: rank_tokens(text)
+        benchmarks[f'rank_abstract_concepts/{name}'] = lambda text=text, ranked=ranked_tokens: rank_abstract_concepts(text, ranked)
+        benchmarks[f'filter_concept_map/{name}'] = lambda cmap=concept_map, ranked=ranked_concepts: filter_concept_map(cmap, ranked)
+        benchmarks[f'send-text/{name}'] = lambda text=text: post(client, '/send-text', json={'text': text})
+    for name, pdf_bytes in pdfs.items():
+        benchmarks[f'extract_text_from_pdf/{name}'] = lambda pdf_bytes=pdf_bytes: extract_text_from_pdf(pdf_bytes)
+        benchmarks[f'send-data/{name}'] = lambda pdf_bytes=pdf_bytes: post(
+            client, '/send-data', data={'text': input_text, 'file': (io.BytesIO(pdf_bytes), 'paper.pdf')}, content_type='multipart/form-data')
+    for name, concept_map in concept_maps.items():
+        benchmarks[f'generate_layout/spring/{name}'] = lambda cmap=concept_map: generate_layout(cmap)
+        benchmarks[f'generate_layout/barnes_hut/{name}'] = lambda cmap=concept_map: generate_layout(cmap, algorithm='barnes_hut')
+    return benchmarks
+
+def measure(function, repeats):
+    """
+    Measure the best time of a function over some repeats, and its peak memory.
+
+    Returns:
+        dict: The time in seconds and the peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeats):
+        # Results of earlier runs must not be served from the cache
+        result_cache.clear()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    # Memory is traced in a separate run, since tracing slows the code down
+    result_cache.clear()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': min(times), 'peak_memory': peak}
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with the baseline.
+
+    Returns:
+        list: Descriptions of the regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for metric in ('time', 'peak_memory'):
+            if result[metric] > expected[metric] * (1 + threshold):
+                regressions.append(f'{name}: {metric} {result[metric]:.4g} > baseline {expected[metric]:.4g}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of the baseline file')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative regression, e.g. 0.25 for 25%%')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed runs of every benchmark')
+    parser.add_argument('--only', default='', help='run only the benchmarks whose name contains this text')
+    args = parser.parse_args()
+
+    results = {}
+    for name, function in build_benchmarks().items():
+        if args.only not in name:
+            continue
+        results[name] = measure(function, args.repeats)
+        print(f'{name:55} {results[name]["time"] * 1000:10.1f} ms {results[name]["peak_memory"] / 1024 / 1024:10.2f} MB')
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(dict(baseline, **results), f, indent=2, sort_keys=True)
+        print(f'Baseline updated: {args.baseline}')
+        return 0
+    if not baseline:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to create it')
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
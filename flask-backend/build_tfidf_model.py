@@ -0,0 +1,62 @@
+# For parsing the command line arguments
+import argparse
+# For file and directory operations
+import os
+
+# Handles extracting and counting the noun phrases of papers
+from ranking import count_noun_phrases, iter_pdf_pages, iter_text_chunks
+# Document frequencies of a reference corpus
+from tfidf import TfidfModel
+
+def iter_paths(paths):
+    """
+    List the PDF and text files given directly or inside directories.
+
+    Args:
+        paths (list): Paths of files and directories.
+
+    Yields:
+        str: Paths of the files.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.lower().endswith(('.pdf', '.txt')):
+                    yield os.path.join(root, name)
+
+def iter_documents(paths):
+    """
+    Extract the preprocessed noun phrases of every document.
+
+    Args:
+        paths (list): Paths of PDF and text files.
+
+    Yields:
+        Counter: Preprocessed noun phrases of a document.
+    """
+    for path in paths:
+        if path.lower().endswith('.pdf'):
+            pages = iter_pdf_pages(path)
+        else:
+            with open(path, encoding='utf-8') as f:
+                pages = [f.read()]
+        print(f'Processing {path}')
+        yield count_noun_phrases(iter_text_chunks(pages))
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the corpus TF-IDF model used to rank the tokens of papers.')
+    parser.add_argument('paths', nargs='+', help='PDF or text files of the reference corpus, or directories containing them')
+    parser.add_argument('--model', required=True, help='path of the model file')
+    parser.add_argument('--update', action='store_true', help='add the documents to an existing model instead of building a new one')
+    args = parser.parse_args()
+
+    model = TfidfModel.load(args.model) if args.update and os.path.exists(args.model) else TfidfModel()
+    model.update(iter_documents(iter_paths(args.paths)))
+    model.save(args.model)
+    print(f'Saved {args.model}: {model.n_documents} documents, {len(model.document_frequency)} words')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+# For file and directory operations
+import os
+# For hashing the cached content
+import hashlib
+# For serializing the cache keys
+import json
+# For serializing the cached values
+import pickle
+# For writing the on-disk entries atomically
+import tempfile
+# For guarding the cache against concurrent requests
+import threading
+# For the least-recently-used ordering of the in-memory entries
+from collections import OrderedDict
+
+def make_key(namespace, *contents, **options):
+    """
+    Build a cache key from a hash of the input content and options.
+
+    Args:
+        namespace (str): The kind of result being cached, e.g. 'layout'.
+        *contents (str or bytes): The input content.
+        **options: Options which change the result, serialized as JSON.
+
+    Returns:
+        str: The cache key.
+    """
+    digest = hashlib.sha256()
+    digest.update(namespace.encode('utf-8'))
+    for content in contents:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        # Prefix every part with its length so that parts cannot run into each other
+        digest.update(str(len(content)).encode('ascii') + b':' + content)
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    return f'{namespace}-{digest.hexdigest()}'
+
+class ResultCache:
+    """
+    A two-tier cache of pipeline results.
+
+    Entries are kept pickled in an in-memory LRU tier bounded by size, and
+    optionally in an on-disk tier which survives restarts. When the disk tier
+    grows past its size the least recently written entries are removed.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    def get(self, key, default=None, prefer_disk=False):
+        """
+        Get a cached value.
+
+        Args:
+            key (str): The cache key.
+            default: The value returned when the key is not cached.
+            prefer_disk (bool): Whether a value read from disk stays out of the memory tier (see set).
+
+        Returns:
+            The cached value, or default.
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return pickle.loads(data)
+            data = self._read_disk(key)
+            if data is not None:
+                self.disk_hits += 1
+                if not prefer_disk:
+                    self._store_memory(key, data)
+                return pickle.loads(data)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, prefer_disk=False):
+        """
+        Cache a value.
+
+        Args:
+            key (str): The cache key.
+            value: The value, which must be picklable.
+            prefer_disk (bool): Whether to keep the value only on disk when there is a disk tier,
+                                e.g. for large inputs which would evict many results from memory.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if not (prefer_disk and self.directory):
+                self._store_memory(key, data)
+            self._write_disk(key, data)
+
+    def get_or_compute(self, key, compute, prefer_disk=False):
+        """
+        Get a cached value, computing and caching it on a miss.
+
+        Args:
+            key (str): The cache key.
+            compute (callable): Called without arguments to compute the value.
+            prefer_disk (bool): Whether to keep the value only on disk when there is a disk tier (see set).
+
+        Returns:
+            The cached or computed value.
+        """
+        missing = object()
+        value = self.get(key, missing, prefer_disk)
+        if value is missing:
+            value = compute()
+            self.set(key, value, prefer_disk)
+        return value
+
+    def clear(self):
+        """
+        Remove every entry from both tiers. The counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            for path, _, _ in self._disk_entries():
+                _remove(path)
+            self._disk_bytes = 0
+
+    def stats(self):
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, entry counts and sizes of both tiers.
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes if self.directory else 0,
+            }
+
+    def _store_memory(self, key, data):
+        # Entries larger than the whole tier are only kept on disk
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = data
+        self._bytes += len(data)
+        # Evict the least recently used entries until the tier fits its size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.directory or len(data) > self.max_disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            self._disk_bytes -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        # Write to a temporary file first so that readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._disk_bytes += len(data)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        # The directory may be shared with other processes, which can remove entries at any time
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        # Other processes write to and evict from a shared directory too, so its size is measured again
+        entries = self._disk_entries()
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        # Remove the oldest entries until the tier fits its size
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            if _remove(path):
+                self.evictions += 1
+            self._disk_bytes -= size
+
+def _remove(path):
+    # Remove a file unless another process already did, and tell whether this one did
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,335 @@
+# For file and directory operations
+import os
+# For the corpora shared by every worker
+import sqlite3
+# For guarding the corpora against concurrent requests
+import threading
+# For counting the surface forms of concepts
+from collections import Counter
+
+# Normalizes noun phrases in the same way as the ranking of PDF tokens
+from ranking import clean_noun_phrases, preprocess_noun_phrases
+
+def canonical_concept(concept):
+    """
+    Get the canonical form of a concept: cleaned, without stopwords and lemmatized.
+
+    Args:
+        concept (str): The concept as found in the text.
+
+    Returns:
+        str: The canonical form, or the lowercased concept if nothing is left of it.
+    """
+    canonical = preprocess_noun_phrases(clean_noun_phrases([concept.lower()]))
+    return canonical[0] if canonical else concept.lower().strip()
+
+def canonical_triples(concept_map):
+    """
+    Get the canonical triples of a concept map, with the surface forms of their concepts.
+
+    Args:
+        concept_map (list): List of concept-relation-concept tuples.
+
+    Returns:
+        list: List of (source, relation, target, concept1, concept2) tuples, without
+              the triples whose two concepts have the same canonical form.
+    """
+    triples = []
+    for concept1, relation, concept2 in concept_map:
+        source = canonical_concept(concept1)
+        target = canonical_concept(concept2)
+        # Both concepts may have the same canonical form
+        if source == target:
+            continue
+        triples.append((source, relation.lower().strip(), target, concept1, concept2))
+    return triples
+
+class Corpus:
+    """
+    A concept map merged from many documents.
+
+    Concepts are indexed by their canonical form, so that e.g. 'the ontologies'
+    and 'ontology' are the same node, labelled with their most frequent surface
+    form. Every edge counts how many triples support it and from which
+    documents. Adding or removing a document only touches its own triples.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # Canonical triples of every document
+        self.documents = {}
+        # Surface forms of every canonical concept, with their number of occurrences
+        self.forms = {}
+        # Support and documents of every (concept, relation, concept) edge
+        self.edges = {}
+
+    def add_document(self, doc_id, concept_map):
+        """
+        Merge the concept map of a document, replacing the document if it was already added.
+
+        Args:
+            doc_id (str): The id of the document.
+            concept_map (list): List of concept-relation-concept tuples of the document.
+
+        Returns:
+            int: The number of triples merged.
+        """
+        return self.add_triples(doc_id, canonical_triples(concept_map))
+
+    def add_triples(self, doc_id, triples):
+        """
+        Merge the canonical triples of a document, replacing the document if it was already added.
+
+        Args:
+            doc_id (str): The id of the document.
+            triples (list): List of (source, relation, target, concept1, concept2) tuples.
+
+        Returns:
+            int: The number of triples merged.
+        """
+        self.remove_document(doc_id)
+        for source, relation, target, concept1, concept2 in triples:
+            self.forms.setdefault(source, Counter())[concept1] += 1
+            self.forms.setdefault(target, Counter())[concept2] += 1
+            edge = self.edges.setdefault((source, relation, target), {'support': 0, 'documents': Counter()})
+            edge['support'] += 1
+            edge['documents'][doc_id] += 1
+        self.documents[doc_id] = triples
+        return len(triples)
+
+    def remove_document(self, doc_id):
+        """
+        Remove the triples of a document.
+
+        Args:
+            doc_id (str): The id of the document.
+
+        Returns:
+            bool: False if the document was not in the corpus.
+        """
+        triples = self.documents.pop(doc_id, None)
+        if triples is None:
+            return False
+        for source, relation, target, concept1, concept2 in triples:
+            for concept, form in ((source, concept1), (target, concept2)):
+                self.forms[concept][form] -= 1
+                self.forms[concept] += Counter()
+                if not self.forms[concept]:
+                    del self.forms[concept]
+            edge = self.edges[(source, relation, target)]
+            edge['support'] -= 1
+            edge['documents'][doc_id] -= 1
+            edge['documents'] += Counter()
+            if not edge['support']:
+                del self.edges[(source, relation, target)]
+        return True
+
+    def copy(self):
+        """
+        Copy the corpus, so that it can be read while the original changes.
+
+        Returns:
+            Corpus: The copy.
+        """
+        corpus = Corpus(self.name)
+        corpus.documents = dict(self.documents)
+        corpus.forms = {concept: Counter(forms) for concept, forms in self.forms.items()}
+        corpus.edges = {edge: {'support': value['support'], 'documents': Counter(value['documents'])}
+                        for edge, value in self.edges.items()}
+        return corpus
+
+    def label(self, concept):
+        """
+        Get the label of a canonical concept: its most frequent surface form.
+
+        Args:
+            concept (str): The canonical concept.
+
+        Returns:
+            str: The label.
+        """
+        return self.forms[concept].most_common(1)[0][0]
+
+    def concept_map(self, min_support=1):
+        """
+        Get the merged concept map.
+
+        Args:
+            min_support (int): Minimum number of triples supporting an edge.
+
+        Returns:
+            list: List of concept-relation-concept tuples, labelled with surface forms.
+        """
+        return [(self.label(source), relation, self.label(target))
+                for (source, relation, target), edge in sorted(self.edges.items()) if edge['support'] >= min_support]
+
+    def summary(self, min_support=1):
+        """
+        Describe the corpus and its edges.
+
+        Args:
+            min_support (int): Minimum number of triples supporting an edge.
+
+        Returns:
+            dict: The documents, the number of concepts and the edges with their support.
+        """
+        return {
+            'name': self.name,
+            'documents': sorted(self.documents),
+            'concepts': len(self.forms),
+            'edges': [{'source': self.label(source), 'relation': relation, 'target': self.label(target),
+                       'support': edge['support'], 'documents': sorted(edge['documents'])}
+                      for (source, relation, target), edge in sorted(self.edges.items()) if edge['support'] >= min_support],
+        }
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS corpora (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    corpus TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    PRIMARY KEY (corpus, doc_id)
+);
+CREATE TABLE IF NOT EXISTS triples (
+    corpus TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    target TEXT NOT NULL,
+    concept1 TEXT NOT NULL,
+    concept2 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS triples_document ON triples (corpus, doc_id);
+'''
+
+class CorpusStore:
+    """
+    The corpora of the server, optionally saved to an SQLite database in a directory.
+
+    With a directory, the triples of every document are rows of the database,
+    so that adding or removing a document only writes its own rows. Every
+    change bumps the version of the corpus, and a worker loads a corpus again
+    when its version was changed by another process, so that every worker
+    sees the same corpora.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._corpora = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._connection = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        # The database is opened on first use, in the worker serving the request, since
+        # connections cannot be shared with processes forked afterwards
+        if self._connection is None and self.directory:
+            self._connection = sqlite3.connect(os.path.join(self.directory, 'corpora.sqlite3'), check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode = WAL')
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def _load(self, name):
+        if self._connect() is None:
+            return self._corpora.get(name)
+        row = self._connection.execute('SELECT version FROM corpora WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            self._corpora.pop(name, None)
+            return None
+        if name not in self._corpora or self._versions.get(name) != row[0]:
+            corpus = Corpus(name)
+            # Documents without any triple are still part of the corpus
+            documents = {doc_id: [] for doc_id, in self._connection.execute(
+                'SELECT doc_id FROM documents WHERE corpus = ? ORDER BY rowid', (name,))}
+            rows = self._connection.execute('SELECT doc_id, source, relation, target, concept1, concept2 FROM triples '
+                                            'WHERE corpus = ? ORDER BY rowid', (name,))
+            for doc_id, *triple in rows:
+                documents[doc_id].append(tuple(triple))
+            for doc_id, triples in documents.items():
+                corpus.add_triples(doc_id, triples)
+            self._corpora[name] = corpus
+            self._versions[name] = row[0]
+        return self._corpora[name]
+
+    def _bump(self, name):
+        # Called inside the transaction of a change, returns the new version of the corpus
+        self._connection.execute('INSERT OR IGNORE INTO corpora (name, version) VALUES (?, 0)', (name,))
+        self._connection.execute('UPDATE corpora SET version = version + 1 WHERE name = ?', (name,))
+        return self._connection.execute('SELECT version FROM corpora WHERE name = ?', (name,)).fetchone()[0]
+
+    def _apply(self, name, version, change):
+        # Change the loaded corpus in place if it was up to date before this change, or load it again on next use
+        corpus = self._corpora.get(name)
+        if corpus is not None and self._versions.get(name) == version - 1:
+            change(corpus)
+            self._versions[name] = version
+        else:
+            self._corpora.pop(name, None)
+
+    def get(self, name):
+        """
+        Get a corpus.
+
+        Args:
+            name (str): The name of the corpus.
+
+        Returns:
+            Corpus: A copy of the corpus, which later changes do not affect, or None if it does not exist.
+        """
+        with self._lock:
+            corpus = self._load(name)
+            return corpus.copy() if corpus is not None else None
+
+    def add_document(self, name, doc_id, concept_map):
+        """
+        Merge the concept map of a document into a corpus, creating the corpus if needed.
+
+        Args:
+            name (str): The name of the corpus.
+            doc_id (str): The id of the document.
+            concept_map (list): List of concept-relation-concept tuples of the document.
+
+        Returns:
+            int: The number of triples merged.
+        """
+        triples = canonical_triples(concept_map)
+        with self._lock:
+            if self._connect() is None:
+                return self._corpora.setdefault(name, Corpus(name)).add_triples(doc_id, triples)
+            with self._connection:
+                self._connection.execute('DELETE FROM triples WHERE corpus = ? AND doc_id = ?', (name, doc_id))
+                self._connection.execute('INSERT OR IGNORE INTO documents VALUES (?, ?)', (name, doc_id))
+                self._connection.executemany('INSERT INTO triples VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                             [(name, doc_id) + triple for triple in triples])
+                version = self._bump(name)
+            self._apply(name, version, lambda corpus: corpus.add_triples(doc_id, triples))
+            return len(triples)
+
+    def remove_document(self, name, doc_id):
+        """
+        Remove a document from a corpus.
+
+        Args:
+            name (str): The name of the corpus.
+            doc_id (str): The id of the document.
+
+        Returns:
+            bool: False if the corpus or the document does not exist.
+        """
+        with self._lock:
+            if self._connect() is None:
+                corpus = self._corpora.get(name)
+                return corpus is not None and corpus.remove_document(doc_id)
+            with self._connection:
+                removed = self._connection.execute('DELETE FROM documents WHERE corpus = ? AND doc_id = ?',
+                                                   (name, doc_id)).rowcount
+                self._connection.execute('DELETE FROM triples WHERE corpus = ? AND doc_id = ?', (name, doc_id))
+                version = self._bump(name) if removed else None
+            if not removed:
+                return False
+            self._apply(name, version, lambda corpus: corpus.remove_document(doc_id))
+            return True
@@ -1,29 +1,83 @@
-# For graph creation and layout generation
+# For graph creation
 import networkx as nx
+# For computing the node positions with the selected layout algorithm
+from layout import compute_layout
 
-def generate_layout(concept_map):
+def pair_key(concept1, concept2, directed=False):
+    """
+    Get the key of a pair of concepts in the relation index.
+
+    Args:
+        concept1 (str): The first concept.
+        concept2 (str): The second concept.
+        directed (bool): Whether the order of the concepts matters.
+
+    Returns:
+        tuple or frozenset: The key of the pair.
+    """
+    return (concept1, concept2) if directed else frozenset((concept1, concept2))
+
+def build_relation_index(concept_map, directed=False):
+    """
+    Index the relations of a concept map by pair of concepts.
+
+    Args:
+        concept_map (list): A list of (concept1, relation, concept2) tuples.
+        directed (bool): Whether the order of the concepts matters.
+
+    Returns:
+        dict: The distinct relations of every pair, in the order they appear in the concept map.
+    """
+    index = {}
+    for concept1, relation, concept2 in concept_map:
+        relations = index.setdefault(pair_key(concept1, concept2, directed), [])
+        if relation not in relations:
+            relations.append(relation)
+    return index
+
+def generate_layout(concept_map, directed=False, multi=False, algorithm='spring', iterations=None, time_budget=None, pack=False, previous_positions=None, warm_start='fixed'):
     """
     Generate a graph layout from a concept map.
 
     Args:
         concept_map (list): A list of tuples representing the concept map, 
                             where each tuple is (concept1, relation, concept2).
+        directed (bool): Whether edges go from concept1 to concept2, instead of being undirected.
+        multi (bool): Whether each relation between two concepts gets its own edge,
+                      instead of one edge per pair labelled with the first relation.
+        algorithm (str): Name of the layout algorithm, 'spring' or 'barnes_hut'.
+        iterations (int): Maximum number of layout iterations.
+        time_budget (float): Maximum number of seconds spent on the layout, if supported.
+        pack (bool): Whether to lay out connected components independently and pack them.
+        previous_positions (dict): Position (x, y) of every node of a previous layout, used
+                                   to warm-start the layout so that unchanged nodes keep their place.
+        warm_start (str): 'fixed' to keep previous nodes in place, or 'relax' to let them move a little.
 
     Returns:
         dict: A dictionary containing nodes and edges with their positions and labels.
     """
-    # Create an empty undirected graph
-    G = nx.Graph()
+    # Index the relations of every pair of concepts once, instead of searching the concept map for each edge
+    relation_index = build_relation_index(concept_map, directed)
+
+    # Create an empty graph of the requested kind
+    if multi:
+        G = nx.MultiDiGraph() if directed else nx.MultiGraph()
+    else:
+        G = nx.DiGraph() if directed else nx.Graph()
 
     # Add nodes and edges to the graph based on the concept map
     for concept1, relation, concept2 in concept_map:
         G.add_node(concept1)
         G.add_node(concept2)
-        G.add_edge(concept1, concept2)
+        if multi:
+            G.add_edge(concept1, concept2, key=relation)
+        else:
+            G.add_edge(concept1, concept2)
 
-    # Generate positions for the nodes using a spring layout algorithm
+    # Generate positions for the nodes using the selected layout algorithm
     # The scale parameter controls the spacing of the layout
-    pos = nx.spring_layout(G, scale=1000)
+    pos = compute_layout(G, algorithm, scale=1000, iterations=iterations, time_budget=time_budget, pack=pack,
+                         previous_positions=previous_positions, warm_start=warm_start)
     
     # Prepare the nodes for the output
     nodes = []
@@ -36,14 +90,38 @@ def generate_layout(concept_map):
 
     # Prepare the edges for the output
     edges = []
-    for concept1, concept2 in G.edges:
-        edges.append({
-            'id': f'{concept1}-{concept2}',
-            'source': concept1,
-            'target': concept2,
-            'label': next(relation for c1, relation, c2 in concept_map if (c1 == concept1 and c2 == concept2) or (c1 == concept2 and c2 == concept1)),
-            'animated': 'true'
-        })
+    if multi:
+        for concept1, concept2, relation in G.edges(keys=True):
+            edges.append({
+                'id': f'{concept1}-{concept2}-{relation}',
+                'source': concept1,
+                'target': concept2,
+                'label': relation,
+                'animated': 'true'
+            })
+    else:
+        for concept1, concept2 in G.edges:
+            relations = relation_index[pair_key(concept1, concept2, directed)]
+            edges.append({
+                'id': f'{concept1}-{concept2}',
+                'source': concept1,
+                'target': concept2,
+                'label': relations[0],
+                'data': {'relations': relations},
+                'animated': 'true'
+            })
     
     # Return the graph as a dictionary containing nodes and edges
-    return {'nodes': nodes, 'edges': edges}
\ No newline at end of file
+    return {'nodes': nodes, 'edges': edges}
+
+def get_positions(graph):
+    """
+    Get the node positions of a graph returned by generate_layout.
+
+    Args:
+        graph (dict): A dictionary containing nodes and edges.
+
+    Returns:
+        dict: The position (x, y) of every node.
+    """
+    return {node['id']: (node['position']['x'], node['position']['y']) for node in graph.get('nodes', [])}
\ No newline at end of file
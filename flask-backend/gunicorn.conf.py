@@ -0,0 +1,39 @@
+# Production server settings, used with: gunicorn -c gunicorn.conf.py
+# For freezing the objects of the preloaded models before forking
+import gc
+# For reading the settings from the environment
+import os
+
+# The Flask app of backend.py
+wsgi_app = 'backend:app'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Every worker runs at most MAX_CONCURRENT_REQUESTS pipeline requests (see admission.py). Workers
+# have more threads than that, so that the requests beyond it reach the admission gate and are
+# refused with a 503 error instead of waiting for a free worker
+max_concurrent_requests = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', max_concurrent_requests + 3))
+# Connections a worker accepts before leaving the others in the listen backlog, and the size of
+# that backlog, beyond which new connections are refused. Both bound how many requests queue
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2 * threads))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 64))
+# Long PDFs can take a while
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+
+# Import the app once in the master process, so that workers are forked with it
+preload_app = True
+
+def on_starting(server):
+    if threads <= max_concurrent_requests:
+        server.log.warning('GUNICORN_THREADS (%d) is not above MAX_CONCURRENT_REQUESTS (%d), so busy workers '
+                           'cannot answer with a 503 error', threads, max_concurrent_requests)
+    # Load the models in the master process, before any worker is forked
+    from pipeline import warm_up
+    server.log.info('Loading models')
+    warm_up()
+    # Move the loaded objects out of the garbage collector's generations, so that
+    # collections in the workers do not write to their pages and the workers keep
+    # sharing them copy-on-write
+    gc.freeze()
+    server.log.info('Models loaded')
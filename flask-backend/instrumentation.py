@@ -0,0 +1,249 @@
+# For logging the profiles of slow requests
+import logging
+# For the stack samples of the sampling profiler
+import sys
+# For guarding the histograms against concurrent requests
+import threading
+# For measuring elapsed time
+import time
+# For measuring the memory allocated by a stage
+import tracemalloc
+# For counting the samples of the sampling profiler
+from collections import Counter
+# For timing stages as a with block
+from contextlib import contextmanager
+# For the trace of the current request
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets of durations, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Upper bounds of the histogram buckets of counts
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+class Histogram:
+    """
+    A Prometheus histogram with labels.
+    """
+
+    def __init__(self, name, description, label, buckets):
+        self.name = name
+        self.description = description
+        self.label = label
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series.setdefault(label_value, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return '\n'.join(lines)
+
+# Aggregated measurements of every request of this process
+REQUEST_DURATION = Histogram('request_duration_seconds', 'Duration of the requests.', 'endpoint', DURATION_BUCKETS)
+STAGE_DURATION = Histogram('stage_duration_seconds', 'Duration of the pipeline stages.', 'stage', DURATION_BUCKETS)
+STAGE_MEMORY = Histogram('stage_allocated_bytes', 'Memory allocated by the pipeline stages, when traced.', 'stage',
+                         tuple(1024 * 2 ** i for i in range(0, 22, 2)))
+PIPELINE_COUNTS = Histogram('pipeline_items', 'Number of items handled by the pipeline per request.', 'item', COUNT_BUCKETS)
+HISTOGRAMS = [REQUEST_DURATION, STAGE_DURATION, STAGE_MEMORY, PIPELINE_COUNTS]
+
+class Trace:
+    """
+    The stage timings and counts of one request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = []
+        self.counts = Counter()
+
+    def server_timing(self):
+        """
+        Format the trace as the value of a Server-Timing header.
+
+        Returns:
+            str: The stage durations in milliseconds, followed by the counts.
+        """
+        metrics = [f'{name};dur={duration * 1000:.1f}' for name, duration, _ in self.stages]
+        metrics += [f'{name};desc={value}' for name, value in sorted(self.counts.items())]
+        metrics.append(f'total;dur={(time.perf_counter() - self.start) * 1000:.1f}')
+        return ', '.join(metrics)
+
+# Trace of the request being handled, if any
+_trace = ContextVar('trace', default=None)
+
+def current_trace():
+    """
+    Get the trace of the request being handled.
+
+    Returns:
+        Trace: The trace, or None outside of a traced request.
+    """
+    return _trace.get()
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage, and measure the memory it allocates when tracemalloc is tracing.
+
+    Args:
+        name (str): Name of the stage.
+    """
+    tracing = tracemalloc.is_tracing()
+    memory_start = tracemalloc.get_traced_memory()[0] if tracing else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        allocated = max(0, tracemalloc.get_traced_memory()[0] - memory_start) if tracing else None
+        STAGE_DURATION.observe(name, duration)
+        if allocated is not None:
+            STAGE_MEMORY.observe(name, allocated)
+        trace = _trace.get()
+        if trace is not None:
+            trace.stages.append((name, duration, allocated))
+
+def count(name, value):
+    """
+    Record the number of items, such as tokens or nodes, handled in the current request.
+
+    Args:
+        name (str): Name of the items.
+        value (int): Number of items.
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace.counts[name] += value
+
+class SamplingProfiler:
+    """
+    Samples the stack of a thread at a fixed interval from a background thread.
+    """
+
+    def __init__(self, thread_id, interval=0.01):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f'{frame.f_code.co_filename}:{frame.f_lineno} {frame.f_code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def report(self, limit=5):
+        """
+        Format the most sampled stacks.
+
+        Args:
+            limit (int): Number of stacks to include.
+
+        Returns:
+            str: The stacks, innermost frame last, with their share of the samples.
+        """
+        total = sum(self.samples.values()) or 1
+        parts = []
+        for stack, samples in self.samples.most_common(limit):
+            parts.append(f'{samples / total:.0%} of {total} samples:\n    ' + '\n    '.join(stack[-8:]))
+        return '\n'.join(parts)
+
+def log_slow_request(endpoint, duration, profiler):
+    # Default hook for slow requests
+    logger.warning('Slow request to %s took %.2fs\n%s', endpoint, duration, profiler.report())
+
+def render_metrics():
+    """
+    Render the aggregated measurements in the Prometheus text format.
+
+    Returns:
+        str: The metrics.
+    """
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+def init_app(app, trace_memory=False, slow_request_seconds=0, slow_request_hook=log_slow_request):
+    """
+    Trace every request of a Flask app, and serve the aggregated measurements at /metrics.
+
+    Args:
+        app (Flask): The app.
+        trace_memory (bool): Whether to trace allocations to measure the memory of every stage.
+                             Tracing slows the code down noticeably.
+        slow_request_seconds (float): When greater than 0, requests are profiled by
+                                      sampling and those slower than this are reported.
+        slow_request_hook (callable): Called with the endpoint, the duration and the
+                                      profiler of every slow request.
+    """
+    from flask import Response, g, request
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    @app.before_request
+    def start_trace():
+        g.trace = Trace()
+        g.trace_token = _trace.set(g.trace)
+        g.profiler = None
+        if slow_request_seconds > 0:
+            g.profiler = SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.pop('trace', None)
+        if trace is None:
+            return response
+        _trace.reset(g.pop('trace_token'))
+        duration = time.perf_counter() - trace.start
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_DURATION.observe(endpoint, duration)
+        for name, value in trace.counts.items():
+            PIPELINE_COUNTS.observe(name, value)
+        response.headers['Server-Timing'] = trace.server_timing()
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+            if duration > slow_request_seconds:
+                slow_request_hook(endpoint, duration, profiler)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exception):
+        # Requests which failed before after_request still have a running profiler
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
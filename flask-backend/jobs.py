@@ -0,0 +1,304 @@
+# For serializing the stages and graphs of jobs
+import json
+# For the job table shared by every worker
+import sqlite3
+# For guarding the job table against concurrent requests
+import threading
+# For expiring finished jobs
+import time
+# For generating job ids
+import uuid
+# For running jobs on a bounded pool of worker processes
+from concurrent.futures import ProcessPoolExecutor
+
+# Runs the cached pipeline from the input text (and PDF) to the graph layout
+from pipeline import generate_concept_graph, result_cache, STAGES
+
+# Statuses of a job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Statuses after which a job no longer changes
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    completed TEXT NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    graph_id TEXT,
+    graph TEXT,
+    submitted REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+'''
+
+class QueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue is at its depth limit.
+    """
+
+class JobCancelled(Exception):
+    """
+    Raised inside a worker when its job has been cancelled.
+    """
+
+class JobStore:
+    """
+    The state of every job, in an SQLite database shared by every worker.
+
+    Jobs run in the process pool of the worker which accepted them, but any
+    worker can report their progress and result, or ask them to stop.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def create(self, job_id):
+        """
+        Add a queued job.
+
+        Args:
+            job_id (str): The id of the job.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('INSERT INTO jobs (job_id, status, completed, submitted) VALUES (?, ?, ?, ?)',
+                                     (job_id, QUEUED, '[]', time.time()))
+
+    def get(self, job_id):
+        """
+        Get the state of a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            dict: The columns of the job, or None if the job is unknown.
+        """
+        with self._lock:
+            cursor = self._connection.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([column[0] for column in cursor.description], row))
+        job['completed'] = json.loads(job['completed'])
+        return job
+
+    def update(self, job_id, **columns):
+        """
+        Change the state of a job.
+
+        Args:
+            job_id (str): The id of the job.
+            **columns: The new values of the columns.
+        """
+        if 'completed' in columns:
+            columns['completed'] = json.dumps(columns['completed'])
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        with self._lock, self._connection:
+            self._connection.execute(f'UPDATE jobs SET {assignments} WHERE job_id = ?', list(columns.values()) + [job_id])
+
+    def request_cancel(self, job_id):
+        """
+        Ask a job to stop, if it has not finished.
+
+        Args:
+            job_id (str): The id of the job.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND finished IS NULL', (job_id,))
+
+    def expire(self, result_ttl):
+        """
+        Forget finished jobs whose results have been kept for long enough.
+
+        Args:
+            result_ttl (float): Number of seconds the results are kept.
+        """
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM jobs WHERE finished < ?', (time.time() - result_ttl,))
+
+def _run_job(job_id, text, pdf_bytes, layout_options, incremental, filter_options, store_path):
+    """
+    Run the pipeline for a job in a worker process, reporting progress.
+
+    Args:
+        job_id (str): The id of the job.
+        text (str): The input text.
+        pdf_bytes (bytes): Content of the PDF file, if any.
+        layout_options (dict): Keyword arguments passed to generate_layout.
+        incremental (bool): Whether to reuse the cached results of unchanged sentences.
+        filter_options (dict): Keyword arguments passed to build_concept_map.
+        store_path (str): Path of the job store.
+
+    Returns:
+        tuple: The id of the generated graph and the graph.
+    """
+    # Connections cannot be shared with the forking process, so every job opens its own
+    store = JobStore(store_path)
+
+    def report(stage):
+        state = store.get(job_id)
+        # Stop at the next stage boundary once the job has been cancelled
+        if state is None or state['cancel_requested']:
+            raise JobCancelled()
+        completed = state['completed']
+        if state['stage']:
+            completed = completed + [state['stage']]
+        store.update(job_id, status=RUNNING, stage=stage, completed=completed)
+
+    report(None)
+    return generate_concept_graph(text, pdf_bytes, progress=report, layout_options=layout_options, incremental=incremental,
+                                  filter_options=filter_options)
+
+class JobManager:
+    """
+    Runs pipeline jobs on a bounded pool of worker processes.
+
+    Submitted jobs wait in a queue of bounded depth. Workers report the stage
+    they are in through a job store shared by every server worker, so that
+    the status of a job can be asked from any of them. Queued jobs are
+    cancelled right away, and running jobs, or jobs queued in another server
+    worker, stop at the next stage boundary.
+    """
+
+    def __init__(self, store_path='jobs.sqlite3', max_workers=2, max_queue=16, result_ttl=600):
+        self.store_path = store_path
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self._futures = {}
+        # Reentrant, since a done callback may run while the lock is held in submit or cancel
+        self._lock = threading.RLock()
+        self._executor = None
+        self._store = None
+
+    def _get_store(self):
+        # The store is opened on first use, in the worker serving the request, since
+        # connections cannot be shared with processes forked afterwards
+        with self._lock:
+            if self._store is None:
+                self._store = JobStore(self.store_path)
+            return self._store
+
+    def submit(self, text, pdf_bytes=None, layout_options=None, incremental=False, filter_options=None):
+        """
+        Submit a pipeline job.
+
+        Args:
+            text (str): The input text.
+            pdf_bytes (bytes): Content of the PDF file, if any.
+            layout_options (dict): Keyword arguments passed to generate_layout.
+            incremental (bool): Whether to reuse the cached results of unchanged sentences.
+            filter_options (dict): Keyword arguments passed to build_concept_map.
+
+        Returns:
+            str: The id of the job.
+
+        Raises:
+            QueueFull: If too many jobs are already waiting or running in this worker.
+        """
+        store = self._get_store()
+        with self._lock:
+            # The pool is created on first use so that importing is cheap
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            store.expire(self.result_ttl)
+            pending = sum(1 for future in self._futures.values() if not future.done())
+            if pending >= self.max_workers + self.max_queue:
+                raise QueueFull(f'The job queue is full ({pending} pending jobs)')
+            job_id = uuid.uuid4().hex
+            store.create(job_id)
+            future = self._executor.submit(_run_job, job_id, text, pdf_bytes, layout_options, incremental, filter_options, self.store_path)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda _: self._finish(job_id))
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get the status, progress and, once done, the result of a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            dict: The job status, or None if the job is unknown.
+        """
+        job = self._get_store().get(job_id)
+        if job is None:
+            return None
+        status = {'job_id': job_id, 'stages': STAGES, 'stage': job['stage'], 'completed': job['completed'], 'status': job['status']}
+        if job['status'] == FAILED:
+            status['error'] = job['error']
+        elif job['status'] == DONE:
+            status['graph_id'] = job['graph_id']
+            status['graph'] = json.loads(job['graph'])
+        elif job['status'] not in FINISHED:
+            status['cancel_requested'] = bool(job['cancel_requested'])
+        return status
+
+    def cancel(self, job_id):
+        """
+        Cancel a job.
+
+        Args:
+            job_id (str): The id of the job.
+
+        Returns:
+            bool: False if the job is unknown, True otherwise.
+        """
+        store = self._get_store()
+        if store.get(job_id) is None:
+            return False
+        with self._lock:
+            future = self._futures.get(job_id)
+            # Jobs still queued in this worker are cancelled right away
+            if future is not None and future.cancel():
+                return True
+        # Otherwise ask the job to stop, wherever it runs
+        store.request_cancel(job_id)
+        return True
+
+    def shutdown(self):
+        """
+        Cancel queued jobs and stop the worker pool.
+        """
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _finish(self, job_id):
+        # Record the outcome of a job of this worker in the shared store
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+        if future is None:
+            return
+        store = self._get_store()
+        if future.cancelled() or isinstance(future.exception(), JobCancelled):
+            store.update(job_id, status=CANCELLED, finished=time.time())
+        elif future.exception() is not None:
+            store.update(job_id, status=FAILED, error=str(future.exception()), finished=time.time())
+        else:
+            graph_id, graph = future.result()
+            # The last reported stage has finished as well
+            job = store.get(job_id)
+            if job is None:
+                return
+            completed = job['completed'] + [job['stage']] if job['stage'] else job['completed']
+            store.update(job_id, status=DONE, stage=None, completed=completed, graph_id=graph_id, graph=json.dumps(graph),
+                         finished=time.time())
+            # Cache the graph in this process too, so that later requests can refer to it by id
+            result_cache.set(graph_id, graph)
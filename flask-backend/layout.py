@@ -0,0 +1,415 @@
+# For measuring the time budget of a layout
+import time
+# For vectorised force computations
+import numpy as np
+# For graph algorithms
+import networkx as nx
+
+# Number of iterations used when no budget is given
+DEFAULT_ITERATIONS = 50
+
+# Number of iterations used when warm-starting from a previous layout
+WARM_START_ITERATIONS = 15
+
+# Maximum distance a node moves in the first iteration, in unit coordinates
+INITIAL_TEMPERATURE = 0.1
+
+# Maximum distance a node moves in the first iteration of a warm start
+WARM_START_TEMPERATURE = 0.01
+
+# Minimum share of the nodes of a graph which must be in the previous layout to warm-start from it.
+# Below it, the few iterations of a warm start at a low temperature cannot settle the new nodes
+WARM_START_MIN_SHARE = 0.5
+
+# Maximum number of nodes in a leaf cell of the Barnes-Hut tree
+LEAF_SIZE = 16
+
+# Ratio of cell side to distance above which a cell is too close to be approximated
+THETA = 1.0
+
+# Strength of the pull of every connected component towards the center of the layout, as in
+# the energy-based spring layout of NetworkX
+GRAVITY = 0.5
+
+# Maximum depth of the Barnes-Hut tree, below which nodes are too close to tell apart
+MAX_TREE_DEPTH = 16
+
+def rescale(positions, scale=1000):
+    """
+    Center positions on the origin and scale them to fit in [-scale, scale].
+
+    Args:
+        positions (ndarray): An (n, 2) array of positions.
+        scale (float): Half the width of the box the positions fit in.
+
+    Returns:
+        ndarray: The rescaled positions.
+    """
+    positions = positions - positions.mean(axis=0)
+    limit = np.abs(positions).max()
+    if limit > 0:
+        positions = positions * (scale / limit)
+    return positions
+
+def spring_layout(G, scale=1000, iterations=None, time_budget=None, seed=None):
+    """
+    Lay out a graph with the NetworkX Fruchterman-Reingold implementation.
+
+    It computes every pairwise force, so each iteration is quadratic in the
+    number of nodes. The time budget is not supported and is ignored.
+
+    Args:
+        G (Graph): The graph.
+        scale (float): Half the width of the box the positions fit in.
+        iterations (int): Number of iterations.
+        time_budget (float): Ignored.
+        seed (int): Seed of the random initial positions.
+
+    Returns:
+        dict: The position of every node.
+    """
+    return nx.spring_layout(G, scale=scale, iterations=iterations or DEFAULT_ITERATIONS, seed=seed)
+
+def _morton_codes(positions, depth=MAX_TREE_DEPTH):
+    """
+    Get the Morton code of every position: the interleaved bits of its cell at the deepest level of a quadtree.
+
+    Args:
+        positions (ndarray): An (n, 2) array of positions.
+        depth (int): Number of levels below the root, at most 16.
+
+    Returns:
+        tuple: The codes, and the side of the square root cell.
+    """
+    low = positions.min(axis=0)
+    side = max((positions.max(axis=0) - low).max(), 1e-9)
+    cells = np.minimum((positions - low) / side * (1 << depth), (1 << depth) - 1).astype(np.uint64)
+    codes = np.zeros(len(positions), dtype=np.uint64)
+    for axis in range(2):
+        # Spread the bits of the coordinate so that one bit of the other coordinate fits between them
+        bits = cells[:, axis]
+        for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+            bits = (bits | (bits << np.uint64(shift))) & np.uint64(mask)
+        codes |= bits << np.uint64(axis)
+    return codes, side
+
+def _build_tree(positions, leaf_size=LEAF_SIZE):
+    """
+    Build a quadtree over the nodes, for the Barnes-Hut approximation.
+
+    Every cell is a square split into four squares of half its side, so the
+    cells of a level all have the same size however the nodes are spread.
+    Nodes are sorted by their Morton code, which makes the nodes of every cell
+    a contiguous range of the returned order. Levels are added until no cell
+    holds more than leaf_size nodes, or the tree is MAX_TREE_DEPTH deep.
+
+    Args:
+        positions (ndarray): An (n, 2) array of positions.
+        leaf_size (int): Maximum number of nodes in a leaf cell.
+
+    Returns:
+        tuple: The node order, the Morton code of every node, and for each level of the
+               tree a dict with the side of its cells and the id, start, mass, center,
+               first child and number of children of its cells.
+    """
+    codes, side = _morton_codes(positions)
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    sorted_positions = positions[order]
+    levels = []
+    for depth in range(MAX_TREE_DEPTH + 1):
+        shift = np.uint64(2 * (MAX_TREE_DEPTH - depth))
+        ids = sorted_codes >> shift
+        starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+        mass = np.diff(np.append(starts, len(ids)))
+        levels.append({
+            'shift': shift,
+            'side': side / (1 << depth),
+            'ids': ids[starts],
+            'start': starts,
+            'mass': mass,
+            'center': np.add.reduceat(sorted_positions, starts, axis=0) / mass[:, None],
+        })
+        if mass.max() <= leaf_size:
+            break
+
+    # Link every cell to the range of its children in the next level
+    for parent, child in zip(levels, levels[1:]):
+        parents_of_children = child['ids'] >> np.uint64(2)
+        parent['first_child'] = np.searchsorted(parents_of_children, parent['ids'], side='left')
+        parent['children'] = np.searchsorted(parents_of_children, parent['ids'], side='right') - parent['first_child']
+    return order, codes, levels
+
+def _expand(pairs_node, pairs_first, pairs_count):
+    """
+    Expand (node, range) pairs into one (node, index) pair per index of the range.
+    """
+    node = np.repeat(pairs_node, pairs_count)
+    offsets = np.arange(len(node)) - np.repeat(np.cumsum(pairs_count) - pairs_count, pairs_count)
+    return node, np.repeat(pairs_first, pairs_count) + offsets
+
+def _repulsion(positions, k, theta=THETA, leaf_size=LEAF_SIZE):
+    """
+    Approximate the repulsive forces between all nodes with Barnes-Hut.
+
+    The tree is walked one level at a time for all nodes at once. A cell
+    which does not hold a node and is far from it, compared to its side,
+    acts on it as one body placed at its center of mass. Otherwise the nodes
+    of a cell with at most leaf_size nodes repel the node exactly, and the
+    children of a larger cell are visited. Since the side of the cells halves
+    at every level, a node visits a bounded number of cells per level.
+    """
+    n = len(positions)
+    k2 = k * k
+    order, codes, levels = _build_tree(positions, leaf_size)
+    # Work in tree order, so that nearby nodes are also near in memory
+    positions = positions[order]
+    codes = codes[order]
+    force = np.zeros_like(positions)
+
+    def accumulate(node, delta, weight):
+        for axis in range(2):
+            force[:, axis] += np.bincount(node, weights=delta[:, axis] * weight, minlength=n)
+
+    # Every node starts at the root cell
+    node = np.arange(n)
+    cell = np.zeros(n, dtype=np.int64)
+    for depth, level in enumerate(levels):
+        delta = positions[node] - level['center'][cell]
+        distance2 = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+        # A cell is far when its side is small compared to its distance, and it does not hold the node
+        far = (level['side'] ** 2 < theta ** 2 * distance2) & ((codes[node] >> level['shift']) != level['ids'][cell])
+        accumulate(node[far], delta[far], level['mass'][cell[far]] * k2 / distance2[far])
+        node = node[~far]
+        cell = cell[~far]
+        # Repel exactly from the nodes of the small cells which are too close
+        leaf = level['mass'][cell] <= leaf_size if depth + 1 < len(levels) else np.ones(len(cell), dtype=bool)
+        exact_node, other = _expand(node[leaf], level['start'][cell[leaf]], level['mass'][cell[leaf]])
+        delta = positions[exact_node] - positions[other]
+        distance2 = np.maximum((delta ** 2).sum(axis=1), 1e-9)
+        # A node does not repel itself
+        accumulate(exact_node, delta, np.where(exact_node == other, 0.0, k2 / distance2))
+        if depth + 1 < len(levels):
+            # Visit the children of the large cells which are too close
+            node, cell = _expand(node[~leaf], level['first_child'][cell[~leaf]], level['children'][cell[~leaf]])
+    unsorted = np.empty_like(force)
+    unsorted[order] = force
+    return unsorted
+
+def barnes_hut_layout(G, scale=1000, iterations=None, time_budget=None, seed=None, initial_positions=None, fixed=None):
+    """
+    Lay out a graph with a vectorised, approximate force-directed algorithm.
+
+    It uses Fruchterman-Reingold forces. Repulsion from distant groups of
+    nodes is approximated by their center of mass, Barnes-Hut style. A node
+    visits a bounded number of cells per level of the quadtree, so one
+    iteration costs about n log n instead of n squared; the depth of the tree
+    grows with how clustered the nodes are, up to MAX_TREE_DEPTH. Connected
+    components are pulled towards the center, as in the spring layout of
+    NetworkX, so that isolated nodes do not shrink the rest of the layout
+    once it is scaled to fit. The layout stops early once the time budget is
+    spent.
+
+    Args:
+        G (Graph): The graph.
+        scale (float): Half the width of the box the positions fit in.
+        iterations (int): Maximum number of iterations.
+        time_budget (float): Maximum number of seconds spent iterating, if any.
+        seed (int): Seed of the random initial positions.
+        initial_positions (dict): Starting position of every node, in unit coordinates.
+                                  When given, the result is not recentered.
+        fixed (list): Nodes which keep their starting position.
+
+    Returns:
+        dict: The position of every node.
+    """
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if initial_positions is None and n == 1:
+        return {nodes[0]: np.zeros(2)}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+    if initial_positions is None:
+        positions = np.random.RandomState(seed).rand(n, 2)
+        temperature = INITIAL_TEMPERATURE
+    else:
+        positions = np.array([initial_positions[node] for node in nodes], dtype=np.float64)
+        temperature = WARM_START_TEMPERATURE
+    # Nodes which do not move
+    frozen = np.zeros(n, dtype=bool)
+    if fixed:
+        frozen[[index[node] for node in fixed]] = True
+    # Connected component of every node, whose center is pulled towards the center of the layout
+    labels = np.zeros(n, dtype=np.int64)
+    for label, component in enumerate(nx.connected_components(G.to_undirected(as_view=True))):
+        labels[[index[node] for node in component]] = label
+    sizes = np.bincount(labels)
+    # Optimal distance between nodes, as in NetworkX
+    k = np.sqrt(1.0 / n)
+    iterations = iterations or DEFAULT_ITERATIONS
+    cooling = temperature / (iterations + 1)
+    deadline = time.perf_counter() + time_budget if time_budget else None
+
+    for _ in range(iterations):
+        displacement = _repulsion(positions, k)
+        # Attraction along the edges
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+            for axis in range(2):
+                displacement[:, axis] -= np.bincount(edges[:, 0], weights=pull[:, axis], minlength=n)
+                displacement[:, axis] += np.bincount(edges[:, 1], weights=pull[:, axis], minlength=n)
+        # Gravity keeps small components and isolated nodes from drifting away from the rest
+        if len(sizes) > 1:
+            centers = np.stack([np.bincount(labels, weights=positions[:, axis]) for axis in range(2)], axis=1) / sizes[:, None]
+            displacement -= GRAVITY * (centers - positions.mean(axis=0))[labels]
+        displacement[frozen] = 0.0
+        # Move every node by at most the temperature
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+
+    if initial_positions is not None:
+        return dict(zip(nodes, positions * scale))
+    return dict(zip(nodes, rescale(positions, scale)))
+
+# Layout algorithms which can be selected per request
+LAYOUT_ALGORITHMS = {
+    'spring': spring_layout,
+    'barnes_hut': barnes_hut_layout,
+}
+
+def pack_components(G, algorithm, scale=1000, **options):
+    """
+    Lay out every connected component on its own and pack them side by side.
+
+    Components are given an area proportional to their number of nodes and
+    are placed in rows, from the largest to the smallest.
+
+    Args:
+        G (Graph): The graph.
+        algorithm (callable): The layout algorithm, one of LAYOUT_ALGORITHMS.
+        scale (float): Half the width of the box the positions fit in.
+        **options: Options passed to the layout algorithm.
+
+    Returns:
+        dict: The position of every node.
+    """
+    components = nx.weakly_connected_components(G) if G.is_directed() else nx.connected_components(G)
+    components = sorted(components, key=len, reverse=True)
+    if len(components) <= 1:
+        return algorithm(G, scale=scale, **options)
+
+    boxes = []
+    for component in components:
+        # Each component gets a box whose area grows with its number of nodes
+        size = np.sqrt(len(component))
+        if len(component) == 1:
+            positions = {next(iter(component)): np.zeros(2)}
+        else:
+            positions = algorithm(G.subgraph(component), scale=size, **options)
+        boxes.append((positions, size))
+
+    # Place the boxes in rows about as wide as the square root of the total area
+    row_width = np.sqrt(sum((2 * size + 1) ** 2 for _, size in boxes))
+    packed = {}
+    x = y = row_height = 0.0
+    for positions, size in boxes:
+        width = 2 * size + 1
+        if x > 0 and x + width > row_width:
+            x = 0.0
+            y += row_height
+            row_height = 0.0
+        for node, position in positions.items():
+            packed[node] = position + np.array([x + width / 2, y + width / 2])
+        x += width
+        row_height = max(row_height, width)
+
+    nodes = list(packed)
+    return dict(zip(nodes, rescale(np.array([packed[node] for node in nodes]), scale)))
+
+def seed_positions(G, previous_positions, scale=1000, seed=None):
+    """
+    Build starting positions for a warm start from a previous layout.
+
+    Nodes of the previous layout keep their position. A new node starts
+    next to the average position of its already placed neighbours, or at a
+    random position if it has none.
+
+    Args:
+        G (Graph): The graph.
+        previous_positions (dict): Position of the nodes of the previous layout.
+        scale (float): Half the width of the box the previous positions fit in.
+        seed (int): Seed of the random positions of the new nodes.
+
+    Returns:
+        tuple: The starting position of every node in unit coordinates,
+               and the list of nodes which were in the previous layout.
+    """
+    random = np.random.RandomState(seed)
+    positions = {node: np.asarray(previous_positions[node], dtype=np.float64) / scale for node in G if node in previous_positions}
+    known = list(positions)
+    for node in G:
+        if node in positions:
+            continue
+        neighbours = [positions[neighbour] for neighbour in nx.all_neighbors(G, node) if neighbour in positions]
+        if neighbours:
+            positions[node] = np.mean(neighbours, axis=0) + random.normal(scale=0.05, size=2)
+        else:
+            positions[node] = random.uniform(-1, 1, size=2)
+    return positions, known
+
+def compute_layout(G, algorithm='spring', scale=1000, iterations=None, time_budget=None, pack=False, seed=None, previous_positions=None, warm_start='fixed'):
+    """
+    Compute the positions of the nodes of a graph.
+
+    With previous positions, the layout is warm-started if at least
+    WARM_START_MIN_SHARE of the nodes were in the previous layout: those
+    nodes start where they were and only a few iterations are run.
+    In 'fixed' mode they stay in place and only the new nodes settle. In
+    'relax' mode every node may move a little. Components are not packed
+    when warm-starting.
+
+    Args:
+        G (Graph): The graph.
+        algorithm (str): Name of the layout algorithm, one of LAYOUT_ALGORITHMS.
+        scale (float): Half the width of the box the positions fit in.
+        iterations (int): Maximum number of iterations.
+        time_budget (float): Maximum number of seconds spent iterating, if supported.
+        pack (bool): Whether to lay out connected components independently and pack them.
+        seed (int): Seed of the random initial positions.
+        previous_positions (dict): Position of the nodes of a previous layout, if any.
+        warm_start (str): 'fixed' or 'relax', how nodes of the previous layout are treated.
+
+    Returns:
+        dict: The position of every node.
+    """
+    if algorithm not in LAYOUT_ALGORITHMS:
+        raise ValueError(f'Unknown layout algorithm: {algorithm}')
+    if warm_start not in ('fixed', 'relax'):
+        raise ValueError(f'Unknown warm start mode: {warm_start}')
+    options = {'iterations': iterations, 'time_budget': time_budget, 'seed': seed}
+
+    # A previous layout which shares few nodes with the graph is of no use
+    shared = sum(1 for node in G if node in previous_positions) if previous_positions else 0
+    if shared and shared >= WARM_START_MIN_SHARE * len(G):
+        initial_positions, known = seed_positions(G, previous_positions, scale, seed)
+        fixed = known if warm_start == 'fixed' else None
+        # Nothing to settle when every node keeps its position
+        if fixed is not None and len(fixed) == len(initial_positions):
+            return {node: position * scale for node, position in initial_positions.items()}
+        options['iterations'] = iterations or WARM_START_ITERATIONS
+        # NetworkX derives its temperature from the extent of the layout and would move
+        # unchanged nodes a lot, so every algorithm is warm-started with the vectorised
+        # integrator, which starts at a low temperature
+        return barnes_hut_layout(G, scale=scale, initial_positions=initial_positions, fixed=fixed, **options)
+
+    layout = LAYOUT_ALGORITHMS[algorithm]
+    if pack:
+        return pack_components(G, layout, scale=scale, **options)
+    return layout(G, scale=scale, **options)
@@ -1,20 +1,82 @@
 # For handling punctuation
 import string
-# For natural language processing
-import spacy
+# For running batches across several processes
+import multiprocessing
+# For searching sorted spans
+from bisect import bisect_left, bisect_right
+# For caching the verb phrase matcher
+from functools import lru_cache
 # For pattern matching in text
 from spacy.matcher import Matcher
-# For coreference resolution
-import neuralcoref
+# Shared spacy models, loaded once per process
+from models import get_pipeline, get_sentencizer
+# For building the keys of cached sentence results
+from cache import make_key
+# Times the coreference and parsing stages, and records the number of items handled in the current request
+from instrumentation import stage, count
+
+# Number of documents buffered by spacy when processing batches
+DEFAULT_BATCH_SIZE = 64
+
+# Number of preceding sentences in which the mentions of a sentence are resolved
+COREF_WINDOW = 2
+
+# Number of sentences resolved together in windowed coreference resolution
+COREF_WINDOW_SENTENCES = 20
+# Number of sentences a window shares with the previous one
+COREF_WINDOW_OVERLAP = 5
 
 # Sample input text for testing
 input_text = "Information used in existing ontology matching solutions are usually grouped into four categories: lexical information, structural information, semantic information, and external information, respectively. By summarizing and analyzing the approaches for utilizing the same kind of information, this paper nds that lexical information is mainly analyzed based on text and dictionary similarity. Similarly, structural information and semantic information are mainly analyzed based on graph structure and reasoner, respectively. The approaches for aggregating information analysis results are discussed. Challenges in the analysis of various types of information for existing ontology matching solutions are also described, and insights into directions for future research are provided."
 
-# Load the spacy language model
-nlp = spacy.load('en_core_web_sm')
+def build_verb_phrase_matcher(vocab):
+    """
+    Build the matcher used to find verb phrases.
+
+    Args:
+        vocab (Vocab): The vocabulary of the spacy language model.
+
+    Returns:
+        Matcher: A matcher with the verb phrase pattern added.
+    """
+    # Initialize the matcher
+    matcher = Matcher(vocab)
+
+    # Define the pattern for verb phrases 
+    # <VERB>*<ADV>*<PART>*<VERB>+<PART>*
+    pattern = [
+        {"POS": "VERB", "OP": "*"},  # Zero or more verbs
+        {"POS": "ADV", "OP": "*"},   # Zero or more adverbs
+        {"POS": "PART", "OP": "*"},  # Zero or more particles
+        {"POS": "VERB", "OP": "+"},  # One or more verbs
+        {"POS": "PART", "OP": "*"},  # Zero or more particles
+        {"POS": "ADP", "OP": "*"},   # Zero or more prepositions
+    ]
+    # Add the pattern to the matcher
+    matcher.add("VerbPhrasePattern", None, pattern)
+    return matcher
+
+@lru_cache(maxsize=None)
+def get_verb_phrase_matcher():
+    """
+    Get the verb phrase matcher, built once and shared by every call.
+
+    Returns:
+        Matcher: The verb phrase matcher.
+    """
+    return build_verb_phrase_matcher(get_pipeline('extraction').vocab)
+
+def parse(text):
+    """
+    Parse the input text without running coreference resolution.
+
+    Args:
+        text (str): The input text.
 
-# Add neuralcoref to the spacy pipeline for coreference resolution
-neuralcoref.add_to_pipe(nlp)
+    Returns:
+        Doc: The parsed spacy document.
+    """
+    return get_pipeline('extraction')(text)
 
 def coreference_resolution(text):
     """
@@ -27,11 +89,183 @@ def coreference_resolution(text):
         str: The text with coreferences resolved.
     """
     # Apply the NLP pipeline
-    doc = nlp(text)
+    doc = get_pipeline('coref')(text)
     # Replace references with main entities
     resolved_text = doc._.coref_resolved
     return resolved_text
 
+def resolve_and_parse(text, window=None, overlap=COREF_WINDOW_OVERLAP, n_process=1):
+    """
+    Resolve coreferences in the input text and return the parsed resolved text.
+
+    The coreference pass already parses the text, so its document is reused
+    when no reference was replaced. Otherwise only the resolved text is parsed again.
+
+    Args:
+        text (str): The input text.
+        window (int): If given, coreferences are resolved in windows of this many
+                      sentences (see coreference_resolution_windowed).
+        overlap (int): Number of sentences shared by consecutive windows.
+        n_process (int): Number of processes resolving windows.
+
+    Returns:
+        Doc: The parsed spacy document of the resolved text.
+    """
+    with stage('coref'):
+        if window:
+            doc = None
+            resolved_text = coreference_resolution_windowed(text, window, overlap, n_process)
+        else:
+            # Apply the NLP pipeline
+            doc = get_pipeline('coref')(text)
+            # Replace references with main entities
+            resolved_text = doc._.coref_resolved
+            if resolved_text is None or resolved_text == doc.text:
+                return doc
+    with stage('parse'):
+        return parse(resolved_text)
+
+def split_sentences(text):
+    """
+    Split the input text into sentences with a rule-based sentencizer.
+
+    Args:
+        text (str): The input text.
+
+    Returns:
+        list: The sentences, with their trailing whitespace, so that joining them gives the text back.
+    """
+    return [sentence.text_with_ws for sentence in get_sentencizer()(text).sents]
+
+def resolve_char_ranges(doc, ranges):
+    """
+    Get the text of character ranges of a document, with coreferences resolved.
+
+    Mentions are replaced by the main mention of their cluster, in the same
+    way as neuralcoref's coref_resolved.
+
+    Args:
+        doc (Doc): A spacy document processed by neuralcoref.
+        ranges (list): List of (start, end) character offsets.
+
+    Returns:
+        list: The resolved text of every range.
+    """
+    resolved = [token.text_with_ws for token in doc]
+    for cluster in doc._.coref_clusters or []:
+        for mention in cluster.mentions:
+            if mention != cluster.main:
+                resolved[mention.start] = cluster.main.text + doc[mention.end - 1].whitespace_
+                for i in range(mention.start + 1, mention.end):
+                    resolved[i] = ''
+    starts = [token.idx for token in doc]
+    return [''.join(resolved[bisect_left(starts, start):bisect_left(starts, end)]) for start, end in ranges]
+
+def split_coreference_windows(n_sentences, window=COREF_WINDOW_SENTENCES, overlap=COREF_WINDOW_OVERLAP):
+    """
+    Split sentences into overlapping windows for coreference resolution.
+
+    Consecutive windows share overlap sentences. Every window owns the
+    sentences after the ones it shares with the previous window, so each
+    sentence is resolved by exactly one window, with at least overlap
+    sentences before it as context (except at the start of the text).
+
+    Args:
+        n_sentences (int): Number of sentences.
+        window (int): Number of sentences in a window.
+        overlap (int): Number of sentences shared by consecutive windows.
+
+    Returns:
+        list: (start, owned_start, end) sentence indices of every window.
+    """
+    if not 0 <= overlap < window:
+        raise ValueError(f'The overlap must be smaller than the window, got {overlap} and {window}')
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window, n_sentences)
+        windows.append((start, start + overlap if windows else 0, end))
+        if end >= n_sentences:
+            return windows
+        start += window - overlap
+
+def _coreference_windows(text, window, overlap):
+    # The sentences every window owns, the text of the window and the character range of the owned sentences
+    sentences = split_sentences(text)
+    windows = []
+    for start, owned_start, end in split_coreference_windows(len(sentences), window, overlap):
+        context = ''.join(sentences[start:owned_start])
+        owned = ''.join(sentences[owned_start:end])
+        windows.append((owned_start, end, context + owned, (len(context), len(context) + len(owned))))
+    return windows
+
+def _resolve_windows(args):
+    # Unpack the arguments, since Pool.map passes a single argument
+    windows, batch_size = args
+    docs = get_pipeline('coref').pipe([window_text for window_text, _ in windows], batch_size=batch_size)
+    return [resolve_char_ranges(doc, [owned])[0] for (_, owned), doc in zip(windows, docs)]
+
+def coreference_resolution_windowed(text, window=COREF_WINDOW_SENTENCES, overlap=COREF_WINDOW_OVERLAP, n_process=1, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Resolve coreferences in the input text, one window of sentences at a time.
+
+    The cost of neuralcoref grows faster than linearly with the number of
+    mentions, so long texts are split into overlapping windows of sentences
+    (see split_coreference_windows) which are resolved independently, and
+    the sentences every window owns are joined back together. Mentions whose
+    antecedent is further back than the window are left as they are.
+
+    Args:
+        text (str): The input text.
+        window (int): Number of sentences in a window.
+        overlap (int): Number of sentences shared by consecutive windows.
+        n_process (int): Number of processes resolving windows.
+        batch_size (int): Number of documents buffered by spacy.
+
+    Returns:
+        str: The text with coreferences resolved.
+    """
+    windows = [(window_text, owned) for _, _, window_text, owned in _coreference_windows(text, window, overlap)]
+
+    n_process = max(1, min(n_process, len(windows)))
+    if n_process == 1:
+        return ''.join(_resolve_windows((windows, batch_size)))
+
+    # Give every process a contiguous run of windows
+    chunk_size = -(-len(windows) // n_process)
+    chunks = [(windows[i:i + chunk_size], batch_size) for i in range(0, len(windows), chunk_size)]
+    with multiprocessing.Pool(n_process) as pool:
+        results = pool.map(_resolve_windows, chunks)
+    return ''.join(resolved for chunk in results for resolved in chunk)
+
+def resolve_and_parse_batch(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Resolve coreferences in many texts and return the parsed resolved texts.
+
+    Args:
+        texts (list): The input texts.
+        batch_size (int): Number of documents buffered by spacy.
+
+    Returns:
+        list: The parsed spacy documents of the resolved texts, in input order.
+    """
+    docs = []
+    # Resolved texts which differ from the input and have to be parsed again
+    reparse = {}
+    for i, doc in enumerate(get_pipeline('coref').pipe(texts, batch_size=batch_size)):
+        resolved_text = doc._.coref_resolved
+        if resolved_text is None or resolved_text == doc.text:
+            docs.append(doc)
+        else:
+            docs.append(None)
+            reparse[i] = resolved_text
+    # Parse the resolved texts
+    indices = list(reparse)
+    parsed = get_pipeline('extraction').pipe([reparse[i] for i in indices], batch_size=batch_size)
+    for i, doc in zip(indices, parsed):
+        docs[i] = doc
+    return docs
+
 def remove_punctuation(tokens):
     """
     Remove punctuation from a list of tokens.
@@ -56,9 +290,18 @@ def extract_tokens(text):
     Returns:
         list: A list of sentences, each containing a list of tokens.
     """
-    # Apply the NLP pipeline
-    doc = nlp(text)
-    
+    return extract_tokens_from_doc(parse(text))
+
+def extract_tokens_from_doc(doc):
+    """
+    Extract tokens from a parsed document, grouped by sentences.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+
+    Returns:
+        list: A list of sentences, each containing a list of tokens.
+    """
     tokens = []
     for sentence in doc.sents:
         sentence_tokens = [token.text.lower() for token in sentence]
@@ -76,9 +319,18 @@ def tag_part_of_speach(text):
     Returns:
         list: A list of sentences, each containing tokens with their POS tags.
     """
-    # Apply the NLP pipeline
-    doc = nlp(text)
-   
+    return tag_part_of_speach_from_doc(parse(text))
+
+def tag_part_of_speach_from_doc(doc):
+    """
+    Tag tokens in a parsed document with their part-of-speech (POS).
+
+    Args:
+        doc (Doc): The parsed spacy document.
+
+    Returns:
+        list: A list of sentences, each containing tokens with their POS tags.
+    """
     pos_tags = []
     for sentence in doc.sents:
         sentence_pos_tags = [(token.text.lower(), token.pos_) for token in sentence if token.text not in string.punctuation]
@@ -95,9 +347,18 @@ def extract_noun_phrases(text):
     Returns:
         list: A list of sentences, each containing noun phrases with their start and end indices.
     """
-    # Apply the NLP pipeline
-    doc = nlp(text)
-    
+    return extract_noun_phrases_from_doc(parse(text))
+
+def extract_noun_phrases_from_doc(doc):
+    """
+    Extract noun phrases from a parsed document.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+
+    Returns:
+        list: A list of sentences, each containing noun phrases with their start and end indices.
+    """
     noun_phrases = []
     for sentence in doc.sents:
         sentence_noun_phrases = [(chunk.start, chunk.end, chunk.text.lower()) for chunk in sentence.noun_chunks]
@@ -114,45 +375,41 @@ def extract_verb_phrases(text):
     Returns:
         list: A list of sentences, each containing verb phrases with their start and end indices.
     """
-    # Apply the NLP pipeline
-    doc = nlp(text)
-    # Initialize the matcher
-    matcher = Matcher(nlp.vocab)
+    return extract_verb_phrases_from_doc(parse(text))
 
-    # Define the pattern for verb phrases 
-    # <VERB>*<ADV>*<PART>*<VERB>+<PART>*
-    pattern = [
-        {"POS": "VERB", "OP": "*"},  # Zero or more verbs
-        {"POS": "ADV", "OP": "*"},   # Zero or more adverbs
-        {"POS": "PART", "OP": "*"},  # Zero or more particles
-        {"POS": "VERB", "OP": "+"},  # One or more verbs
-        {"POS": "PART", "OP": "*"},  # Zero or more particles
-        {"POS": "ADP", "OP": "*"},   # Zero or more prepositions
-    ]
-    # Add the pattern to the matcher
-    matcher.add("VerbPhrasePattern", None, pattern)
-    
+def extract_verb_phrases_from_doc(doc):
+    """
+    Extract verb phrases from a parsed document using pattern matching.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+
+    Returns:
+        list: A list of sentences, each containing verb phrases with their start and end indices.
+    """
     # Apply the matcher to the document
-    matches = matcher(doc)
+    matches = get_verb_phrase_matcher()(doc)
     spans = [doc[start:end] for match_id, start, end in matches]
 
-    # Filter overlapping spans
+    # Filter overlapping spans, keeping the longest span among those starting at the same token
     spans = sorted(spans, key=lambda span: (span.start, -(span.end - span.start)))
-    
+
+    # Accepted spans are sorted and do not overlap, so a span overlaps one of them
+    # exactly when it starts before the end of the last one
     filtered_spans = []
+    last_end = -1
     for span in spans:
-        # Check if span overlaps with any already accepted span
-        if not any(span.start < accepted_span.end and span.end > accepted_span.start for accepted_span in filtered_spans):
+        if span.start >= last_end:
             filtered_spans.append(span)
-    
+            last_end = span.end
+
+    # Bucket the spans by sentence, keeping those which lie within it
+    starts = [span.start for span in filtered_spans]
     verb_phrases = []
     for sentence in doc.sents:
-        sentence_verb_phrases = []
-        for span in filtered_spans:
-            start, end = span.start, span.end
-            if start >= sentence.start and end <= sentence.end:
-                sentence_verb_phrases.append((start, end, doc[start:end].text))
-        verb_phrases.append(sentence_verb_phrases)
+        lo = bisect_left(starts, sentence.start)
+        hi = bisect_left(starts, sentence.end)
+        verb_phrases.append([(span.start, span.end, span.text) for span in filtered_spans[lo:hi] if span.end <= sentence.end])
 
     return verb_phrases
 
@@ -160,6 +417,11 @@ def find_possible_relations(concepts, links):
     """
     Find possible relations between concepts based on links.
 
+    The links between two concepts are the ones which lie between them. The
+    links of a sentence do not overlap (see extract_verb_phrases), so sorted
+    by start they are sorted by end as well, and the links between two
+    concepts are a contiguous run found by bisection.
+
     Args:
         concepts (list): List of concepts grouped by sentences.
         links (list): List of links grouped by sentences.
@@ -169,14 +431,24 @@ def find_possible_relations(concepts, links):
     """
     relations = []
     for sentence_concepts, sentence_links in zip(concepts, links):
+        sentence_links = sorted(sentence_links)
+        link_starts = [link[0] for link in sentence_links]
+        link_ends = [link[1] for link in sentence_links]
+        concept_starts = [concept[0] for concept in sentence_concepts]
         sentence_relations = []
         for i in range(len(sentence_concepts) - 1):
-            for j in range(i + 1, len(sentence_concepts)):
-                start1, end1, concept1 = sentence_concepts[i]
+            start1, end1, concept1 = sentence_concepts[i]
+            # The first link after the concept
+            lo = bisect_left(link_starts, end1)
+            if lo == len(sentence_links):
+                continue
+            # Only concepts starting after the end of that link can have links before them
+            first = max(i + 1, bisect_left(concept_starts, link_ends[lo]))
+            for j in range(first, len(sentence_concepts)):
                 start2, end2, concept2 = sentence_concepts[j]
-                links = [link[2] for link in sentence_links if end1 <= link[0] and start2 >= link[1]]
-                if links:
-                    sentence_relations.append((concept1, concept2, links))
+                hi = bisect_right(link_ends, start2)
+                if lo < hi:
+                    sentence_relations.append((concept1, concept2, [link[2] for link in sentence_links[lo:hi]]))
         relations.append(sentence_relations)
     return relations
 
@@ -187,6 +459,26 @@ def find_concept_link_concept_pairs(text):
     Args:
         text (str): The input text.
 
+    Returns:
+        list: A list of tuples representing concept-relation-concept pairs.
+    """
+    return find_concept_link_concept_pairs_from_doc(parse(text))
+
+def find_concept_link_concept_pairs_from_doc(doc, allowed_concepts=None):
+    """
+    Extract concept-relation-concept pairs from a parsed document.
+
+    Every stage (noun phrases, verb phrases and dependency checks) works
+    on the same document, so the text is parsed only once.
+
+    The relations of two concepts only depend on the links between them, so
+    dropping the other concepts before searching for relations gives exactly
+    the pairs of the full result whose concepts are both allowed.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+        allowed_concepts (set): If given, only pairs of these concepts are extracted.
+
     Returns:
         list: A list of tuples representing concept-relation-concept pairs.
     """
@@ -197,11 +489,16 @@ def find_concept_link_concept_pairs(text):
     # COMPOUNDS = ["compound"]
     PREPOSITIONS = ["prep"]
     
-    # Apply the NLP pipeline
-    doc = nlp(text)
-    noun_phrases = extract_noun_phrases(text)
-    verb_phrases = extract_verb_phrases(text)
+    noun_phrases = extract_noun_phrases_from_doc(doc)
+    if allowed_concepts is not None:
+        noun_phrases = [[noun_phrase for noun_phrase in sentence_noun_phrases if noun_phrase[2] in allowed_concepts]
+                        for sentence_noun_phrases in noun_phrases]
+    verb_phrases = extract_verb_phrases_from_doc(doc)
     possible_links = find_possible_relations(noun_phrases, verb_phrases)
+    count('tokens', len(doc))
+    count('noun_phrases', sum(len(sentence_noun_phrases) for sentence_noun_phrases in noun_phrases))
+    count('verb_phrases', sum(len(sentence_verb_phrases) for sentence_verb_phrases in verb_phrases))
+    count('candidate_pairs', sum(len(sentence_possible_links) for sentence_possible_links in possible_links))
     
     pairs = []
     
@@ -230,10 +527,126 @@ def find_concept_link_concept_pairs(text):
                         pairs.append((subj, verb_phrase, obj))
     return pairs
 
+def find_concept_link_concept_pairs_incremental(text, cache, window=COREF_WINDOW, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Resolve coreferences and extract concept-relation-concept pairs, reusing the results of unchanged sentences.
+
+    Every sentence is fingerprinted together with the window of sentences
+    before it. Those are the sentences its coreferences are resolved in.
+    Sentences whose fingerprint is cached are not processed again. The
+    other sentences are resolved within their window, parsed on their own,
+    and their pairs are cached. The cost of an edit therefore grows with
+    the number of sentences it touches, not with the length of the text.
+
+    Args:
+        text (str): The input text.
+        cache (ResultCache): Cache of the results of every sentence.
+        window (int): Number of preceding sentences used to resolve coreferences.
+        batch_size (int): Number of documents buffered by spacy.
+
+    Returns:
+        tuple: The resolved text, the list of concept-relation-concept tuples,
+               and the number of sentences which were processed again.
+    """
+    sentences = split_sentences(text)
+    keys = [make_key('sentence', *sentences[max(0, i - window):i + 1], window=window) for i in range(len(sentences))]
+    results = [cache.get(key) for key in keys]
+    changed = [i for i, result in enumerate(results) if result is None]
+
+    # Resolve the coreferences of every changed sentence within its window
+    windows = [''.join(sentences[max(0, i - window):i + 1]) for i in changed]
+    resolved_sentences = []
+    with stage('coref'):
+        for i, window_text, doc in zip(changed, windows, get_pipeline('coref').pipe(windows, batch_size=batch_size)):
+            resolved_sentences.extend(resolve_char_ranges(doc, [(len(window_text) - len(sentences[i]), len(window_text))]))
+
+    # Extract the pairs of every changed sentence and cache them
+    docs = get_pipeline('extraction').pipe(resolved_sentences, batch_size=batch_size)
+    for i, resolved_sentence, doc in zip(changed, resolved_sentences, docs):
+        results[i] = (resolved_sentence, find_concept_link_concept_pairs_from_doc(doc))
+        cache.set(keys[i], results[i])
+
+    resolved_text = ''.join(resolved_sentence for resolved_sentence, _ in results)
+    pairs = [pair for _, sentence_pairs in results for pair in sentence_pairs]
+    return resolved_text, pairs, len(changed)
+
+def iter_concept_link_concept_pairs(text, window=COREF_WINDOW_SENTENCES, overlap=COREF_WINDOW_OVERLAP, cache=None):
+    """
+    Resolve coreferences and extract concept-relation-concept pairs one window of sentences at a time.
+
+    The windows are those of coreference_resolution_windowed, so the pairs of
+    the first sentences are available long before the whole text is processed.
+
+    Args:
+        text (str): The input text.
+        window (int): Number of sentences in a window.
+        overlap (int): Number of sentences shared by consecutive windows.
+        cache (ResultCache): Cache of the results of every window, if any.
+
+    Yields:
+        tuple: The indices of the first and after the last sentence the window owns,
+               the resolved text of those sentences, and their concept-relation-concept tuples.
+    """
+    for owned_start, end, window_text, owned in _coreference_windows(text, window, overlap):
+        def compute(window_text=window_text, owned=owned):
+            resolved = resolve_char_ranges(get_pipeline('coref')(window_text), [owned])[0]
+            return resolved, find_concept_link_concept_pairs_from_doc(parse(resolved))
+        if cache is None:
+            resolved, pairs = compute()
+        else:
+            resolved, pairs = cache.get_or_compute(make_key('stream_window', window_text, owned=owned), compute)
+        yield owned_start, end, resolved, pairs
+
+def _find_concept_link_concept_pairs_batch(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Resolve coreferences and extract concept-relation-concept pairs in the current process.
+
+    Args:
+        texts (list): The input texts.
+        batch_size (int): Number of documents buffered by spacy.
+
+    Returns:
+        list: A list of concept maps, one per input text.
+    """
+    return [find_concept_link_concept_pairs_from_doc(doc) for doc in resolve_and_parse_batch(texts, batch_size)]
+
+def _run_batch(args):
+    # Unpack the arguments, since Pool.map passes a single argument
+    texts, batch_size = args
+    return _find_concept_link_concept_pairs_batch(texts, batch_size)
+
+def find_concept_link_concept_pairs_batch(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=1):
+    """
+    Resolve coreferences and extract concept-relation-concept pairs from many texts.
+
+    With n_process > 1 the texts are split into contiguous chunks which are
+    processed by a pool of worker processes, each with its own spacy model.
+
+    Args:
+        texts (list): The input texts.
+        batch_size (int): Number of documents buffered by spacy.
+        n_process (int): Number of processes to use.
+
+    Returns:
+        list: A list of concept maps, one per input text, in input order.
+    """
+    texts = list(texts)
+    n_process = max(1, min(n_process, len(texts)))
+    if n_process == 1:
+        return _find_concept_link_concept_pairs_batch(texts, batch_size)
+
+    # Use a few chunks per process so that slow documents do not leave processes idle
+    n_chunks = min(len(texts), n_process * 4)
+    chunk_size = -(-len(texts) // n_chunks)
+    chunks = [(texts[i:i + chunk_size], batch_size) for i in range(0, len(texts), chunk_size)]
+    with multiprocessing.Pool(n_process) as pool:
+        results = pool.map(_run_batch, chunks)
+    return [concept_map for chunk in results for concept_map in chunk]
+
 if __name__ == '__main__':
     # Test the coreference resolution and concept extraction
-    resolved_text = coreference_resolution(input_text)
-    for concept in find_concept_link_concept_pairs(resolved_text):
+    resolved_doc = resolve_and_parse(input_text)
+    for concept in find_concept_link_concept_pairs_from_doc(resolved_doc):
         print(concept)
     # pairs = find_concept_link_concept_pairs(resolved_text)
     # print(pairs)
\ No newline at end of file
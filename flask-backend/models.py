@@ -0,0 +1,139 @@
+# For guarding the registry against concurrent loads
+import threading
+# For caching the NLTK resources
+from functools import lru_cache
+# For natural language processing
+import spacy
+# For removing stopwords
+from nltk.corpus import stopwords
+# For lemmatizing words
+from nltk.stem import WordNetLemmatizer
+
+# Name of the spacy language model used by every stage
+MODEL_NAME = 'en_core_web_sm'
+
+# Name of the coreference component in the spacy pipeline
+COREF_PIPE = 'neuralcoref'
+
+# Components each stage does not need, disabled when the stage runs
+STAGE_DISABLED_PIPES = {
+    # Coreference resolution needs the full pipeline
+    'coref': [],
+    # Concept extraction needs tags, dependencies and noun chunks
+    'extraction': ['ner', COREF_PIPE],
+    # Ranking only needs noun chunks
+    'ranking': ['ner', COREF_PIPE],
+}
+
+# Loaded spacy models, keyed by model name
+_models = {}
+# Names of the loaded models which have neuralcoref attached
+_coref_models = set()
+# Lock used so that a model is loaded only once per process
+_lock = threading.Lock()
+
+class PipelineView:
+    """
+    A view of a shared spacy model that runs with some components disabled.
+
+    Every view of a model shares the same weights, so handing out trimmed
+    pipelines does not load the model again.
+    """
+
+    def __init__(self, nlp, disable):
+        self.nlp = nlp
+        self.disable = list(disable)
+
+    @property
+    def vocab(self):
+        return self.nlp.vocab
+
+    def __call__(self, text):
+        return self.nlp(text, disable=self.disable)
+
+    def pipe(self, texts, **kwargs):
+        return self.nlp.pipe(texts, disable=self.disable, **kwargs)
+
+def load_model(name=MODEL_NAME, coref=False):
+    """
+    Load a spacy model once per process, attaching neuralcoref the first time it is needed.
+
+    Args:
+        name (str): Name of the spacy model.
+        coref (bool): Whether the model must resolve coreferences.
+
+    Returns:
+        Language: The shared spacy model.
+    """
+    nlp = _models.get(name)
+    if nlp is not None and (not coref or name in _coref_models):
+        return nlp
+    with _lock:
+        if name not in _models:
+            _models[name] = spacy.load(name)
+        if coref and name not in _coref_models:
+            # Imported here so that processes which never resolve coreferences do not pay for it
+            import neuralcoref
+            # Add neuralcoref to the spacy pipeline for coreference resolution
+            neuralcoref.add_to_pipe(_models[name])
+            _coref_models.add(name)
+    return _models[name]
+
+def get_pipeline(stage, name=MODEL_NAME):
+    """
+    Get the pipeline for a stage, with the components it does not need disabled.
+
+    Args:
+        stage (str): One of the keys of STAGE_DISABLED_PIPES.
+        name (str): Name of the spacy model.
+
+    Returns:
+        PipelineView: The trimmed pipeline.
+    """
+    if stage not in STAGE_DISABLED_PIPES:
+        raise ValueError(f'Unknown pipeline stage: {stage}')
+    return PipelineView(load_model(name, coref=stage == 'coref'), STAGE_DISABLED_PIPES[stage])
+
+def is_loaded(name=MODEL_NAME):
+    """
+    Check whether a spacy model has already been loaded in this process.
+
+    Args:
+        name (str): Name of the spacy model.
+
+    Returns:
+        bool: True if the model is loaded.
+    """
+    return name in _models
+
+@lru_cache(maxsize=None)
+def get_sentencizer():
+    """
+    Get a rule-based sentence splitter, which needs no model weights.
+
+    Returns:
+        Language: A blank English pipeline with a sentencizer.
+    """
+    nlp = spacy.blank('en')
+    nlp.add_pipe(nlp.create_pipe('sentencizer'))
+    return nlp
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    """
+    Get the English stopwords.
+
+    Returns:
+        frozenset: The set of English stopwords.
+    """
+    return frozenset(stopwords.words('english'))
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    """
+    Get the shared WordNet lemmatizer.
+
+    Returns:
+        WordNetLemmatizer: The lemmatizer.
+    """
+    return WordNetLemmatizer()
@@ -0,0 +1,361 @@
+# For file and directory operations
+import os
+# For spacing the provisional layouts of streamed graphs
+import time
+
+# Handles processing the text and extracting (concept -> relation -> concept) pairs
+from logic import (resolve_and_parse, find_concept_link_concept_pairs_from_doc, find_concept_link_concept_pairs_incremental,
+                   iter_concept_link_concept_pairs)
+# Handles generating the graph layout (the coordinates of the nodes and edges)
+from graph import generate_layout, get_positions
+# Handles extracting additional information from the PDF for an improved graph
+from ranking import (extract_pdf_pages, remove_layout_lines, iter_text_chunks, rank_tokens_from_chunks, rank_abstract_concepts,
+                     rank_abstract_concepts_from_doc, filter_concept_map, select_top_concepts)
+# Content-addressed cache of the results of each stage
+from cache import ResultCache, make_key
+# Times the stages of the pipeline and records their counts
+from instrumentation import stage, count
+# Document frequencies of a reference corpus, used to rank the tokens of papers
+from tfidf import get_tfidf_model
+
+# Cache of pipeline results shared by every request of this process
+result_cache = ResultCache(
+    max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    directory=os.environ.get('CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('CACHE_MAX_DISK_BYTES', 1024 * 1024 * 1024)),
+)
+
+# Path of the corpus TF-IDF model built with build_tfidf_model.py. Without it, the
+# IDF weights of a paper are computed from the paper itself
+TFIDF_MODEL_PATH = os.environ.get('TFIDF_MODEL') or None
+
+# Maximum number of processes extracting the pages of a PDF file
+PDF_PROCESSES = int(os.environ.get('PDF_PROCESSES', 1))
+# Whether running headers, footers and the reference section are left out of the text of PDF files
+PDF_SKIP_LAYOUT = os.environ.get('PDF_SKIP_LAYOUT', '') == '1'
+
+# Number of sentences per window of coreference resolution, 0 to resolve the whole text at once
+COREF_WINDOW_SENTENCES = int(os.environ.get('COREF_WINDOW_SENTENCES', 0))
+# Number of sentences shared by consecutive windows
+COREF_WINDOW_OVERLAP = int(os.environ.get('COREF_WINDOW_OVERLAP', 5))
+# Number of processes resolving the windows
+COREF_PROCESSES = int(os.environ.get('COREF_PROCESSES', 1))
+
+# Number of sentences processed at a time when streaming a graph
+STREAM_WINDOW_SENTENCES = int(os.environ.get('STREAM_WINDOW_SENTENCES', 5))
+# Number of sentences shared by consecutive windows when streaming a graph, kept low since
+# every shared sentence is resolved once more
+STREAM_WINDOW_OVERLAP = int(os.environ.get('STREAM_WINDOW_OVERLAP', 1))
+# Minimum number of seconds between two provisional layouts of a streamed graph
+STREAM_LAYOUT_INTERVAL = float(os.environ.get('STREAM_LAYOUT_INTERVAL', 0.5))
+
+# Short text run through every stage to warm up the models
+WARM_UP_TEXT = 'The parser reads the text. It builds a concept map from the text.'
+
+# Number of top-ranked concepts kept when a PDF file is given
+DEFAULT_TOP_N = 15
+
+# Stages of the pipeline, in the order they are reported to the progress callback
+STAGES = ['extraction', 'pdf_ranking', 'concept_ranking', 'filtering', 'layout']
+
+# Whether warm_up has run in this process
+_warm = False
+
+def warm_up():
+    """
+    Load the models and run every stage once, so that the first request does not pay for it.
+
+    Run before forking workers, this also lets them share the loaded models copy-on-write.
+    """
+    global _warm
+    resolved_doc = resolve_and_parse(WARM_UP_TEXT)
+    concept_map = find_concept_link_concept_pairs_from_doc(resolved_doc)
+    # Loads the NLTK stopwords and WordNet
+    rank_abstract_concepts(resolved_doc.text, {})
+    generate_layout(concept_map)
+    _warm = True
+
+def is_warm():
+    """
+    Check whether warm_up has run in this process.
+
+    Returns:
+        bool: True once the models are loaded and have run.
+    """
+    return _warm
+
+def extract_concept_map(text, incremental=False):
+    """
+    Resolve coreferences in the text and extract its concept map.
+
+    Args:
+        text (str): The input text.
+        incremental (bool): Whether to process the text sentence by sentence, reusing
+                            the cached results of sentences which did not change.
+
+    Returns:
+        tuple: The resolved text and the list of concept-relation-concept tuples.
+    """
+    def compute():
+        if incremental:
+            resolved_text, concept_map, _ = find_concept_link_concept_pairs_incremental(text, result_cache)
+            return resolved_text, concept_map
+        # Perform coreference resolution on the input text and parse the result
+        resolved_doc = resolve_and_parse(text, COREF_WINDOW_SENTENCES, COREF_WINDOW_OVERLAP, COREF_PROCESSES)
+        # Extract concept map (concept -> relation -> concept) pairs
+        return resolved_doc.text, find_concept_link_concept_pairs_from_doc(resolved_doc)
+    return result_cache.get_or_compute(make_key('concept_map', text, incremental=incremental, coref_window=COREF_WINDOW_SENTENCES, coref_overlap=COREF_WINDOW_OVERLAP), compute)
+
+def extract_pdf_text(pdf_bytes, skip_layout=None):
+    """
+    Extract the text of every page of a PDF file, cached by the content of the file.
+
+    The pages are cached as extracted, on disk only when the cache has a disk
+    tier, and the layout is removed from them on every call, so that both
+    settings of skip_layout share one extraction.
+
+    Args:
+        pdf_bytes (bytes): Content of the PDF file.
+        skip_layout (bool): Whether to remove running headers, footers and the reference
+                            section. Defaults to PDF_SKIP_LAYOUT.
+
+    Returns:
+        list: Extracted text of each page.
+    """
+    if skip_layout is None:
+        skip_layout = PDF_SKIP_LAYOUT
+
+    def compute():
+        with stage('pdf_extract'):
+            pages = extract_pdf_pages(pdf_bytes, PDF_PROCESSES)
+        count('pdf_pages', len(pages))
+        return pages
+
+    pages = result_cache.get_or_compute(make_key('pdf_pages', pdf_bytes), compute, prefer_disk=True)
+    return remove_layout_lines(pages) if skip_layout else pages
+
+def extract_pdf_concept_map(pdf_bytes):
+    """
+    Extract the concept map of the whole text of a PDF file, a chunk of pages at a time.
+
+    Every chunk is parsed on its own, so that long files stay under the
+    maximum length of a spaCy document.
+
+    Args:
+        pdf_bytes (bytes): Content of the PDF file.
+
+    Returns:
+        list: List of concept-relation-concept tuples.
+    """
+    concept_map = []
+    for chunk in iter_text_chunks(extract_pdf_text(pdf_bytes)):
+        concept_map.extend(extract_concept_map(chunk)[1])
+    return concept_map
+
+def rank_pdf(pdf_bytes):
+    """
+    Extract the text of a PDF file and rank its tokens.
+
+    Args:
+        pdf_bytes (bytes): Content of the PDF file.
+
+    Returns:
+        dict: Dictionary of tokens and their TF-IDF scores.
+    """
+    model = get_tfidf_model(TFIDF_MODEL_PATH) if TFIDF_MODEL_PATH else None
+    # Rank the tokens of the PDF text, a chunk of pages at a time
+    compute = lambda: rank_tokens_from_chunks(iter_text_chunks(extract_pdf_text(pdf_bytes)), model=model)
+    key = make_key('ranked_tokens', pdf_bytes, tfidf_model=model.digest if model else None, skip_layout=PDF_SKIP_LAYOUT)
+    return result_cache.get_or_compute(key, compute)
+
+def layout_graph(concept_map, layout_options=None):
+    """
+    Generate the graph layout of a concept map.
+
+    Args:
+        concept_map (list): List of concept-relation-concept tuples.
+        layout_options (dict): Keyword arguments passed to generate_layout.
+
+    Returns:
+        tuple: The id of the graph, which can be passed to get_graph, and a dictionary
+               containing nodes and edges with their positions and labels.
+    """
+    layout_options = layout_options or {}
+    graph_id = make_key('layout', *(part for triple in concept_map for part in triple), **layout_options)
+    graph = result_cache.get_or_compute(graph_id, lambda: generate_layout(concept_map, **layout_options))
+    count('nodes', len(graph['nodes']))
+    count('edges', len(graph['edges']))
+    return graph_id, graph
+
+def get_graph(graph_id):
+    """
+    Get a previously generated graph by its id.
+
+    Args:
+        graph_id (str): The id returned by layout_graph.
+
+    Returns:
+        dict: The graph, or None if it is no longer cached.
+    """
+    return result_cache.get(graph_id)
+
+def build_pruned_concept_map(text, pdf_bytes, progress, top_n=DEFAULT_TOP_N, min_score=None):
+    """
+    Extract the concept map of the input text, ranking concepts first.
+
+    Only the top-ranked concepts take part in the relation search and the
+    dependency checks, which gives the same result as filtering the full
+    concept map (see find_concept_link_concept_pairs_from_doc).
+
+    Args:
+        text (str): The input text.
+        pdf_bytes (bytes): Content of the PDF file of the paper.
+        progress (callable): Called with the name of each stage (see STAGES) before it starts.
+        top_n (int): Number of top concepts to include, or None for all of them.
+        min_score (float): Minimum score of the included concepts, if any.
+
+    Returns:
+        list: List of concept-relation-concept tuples.
+    """
+    model = get_tfidf_model(TFIDF_MODEL_PATH) if TFIDF_MODEL_PATH else None
+    key = make_key('pruned_concept_map', text, pdf_bytes, top_n=top_n, min_score=min_score,
+                   tfidf_model=model.digest if model else None, coref_window=COREF_WINDOW_SENTENCES,
+                   coref_overlap=COREF_WINDOW_OVERLAP, skip_layout=PDF_SKIP_LAYOUT)
+    concept_map = result_cache.get(key)
+    if concept_map is not None:
+        return concept_map
+
+    progress('extraction')
+    with stage('extraction'):
+        resolved_doc = resolve_and_parse(text, COREF_WINDOW_SENTENCES, COREF_WINDOW_OVERLAP, COREF_PROCESSES)
+    progress('pdf_ranking')
+    with stage('pdf_ranking'):
+        ranked_tokens = rank_pdf(pdf_bytes)
+    count('ranked_tokens', len(ranked_tokens))
+    progress('concept_ranking')
+    with stage('concept_ranking'):
+        # The resolved document is already parsed, so its noun chunks are reused
+        ranked_abstract_concepts = rank_abstract_concepts_from_doc(resolved_doc, ranked_tokens)
+    count('ranked_concepts', len(ranked_abstract_concepts))
+    # Search for relations between the top concepts only
+    progress('filtering')
+    with stage('filtering'):
+        allowed_concepts = select_top_concepts(ranked_abstract_concepts, top_n, min_score)
+        concept_map = find_concept_link_concept_pairs_from_doc(resolved_doc, allowed_concepts)
+    count('triples', len(concept_map))
+    result_cache.set(key, concept_map)
+    return concept_map
+
+def build_concept_map(text, pdf_bytes=None, progress=None, incremental=False, prune=False, top_n=DEFAULT_TOP_N, min_score=None):
+    """
+    Extract the concept map of the input text, filtered using the PDF file if any.
+
+    Args:
+        text (str): The input text.
+        pdf_bytes (bytes): Content of the PDF file of the paper, if any.
+        progress (callable): Called with the name of each stage (see STAGES) before it starts.
+        incremental (bool): Whether to reuse the cached results of unchanged sentences.
+        prune (bool): Whether to rank concepts before extracting relations (see build_pruned_concept_map).
+                      Only used with a PDF file and without incremental.
+        top_n (int): Number of top concepts kept when a PDF file is given, or None for all of them.
+        min_score (float): Minimum score of the kept concepts, if any.
+
+    Returns:
+        list: List of concept-relation-concept tuples.
+    """
+    if progress is None:
+        progress = lambda stage: None
+    if prune and text and pdf_bytes and not incremental:
+        return build_pruned_concept_map(text, pdf_bytes, progress, top_n, min_score)
+
+    concept_map = []
+    resolved_text = ''
+    if text:
+        progress('extraction')
+        with stage('extraction'):
+            resolved_text, concept_map = extract_concept_map(text, incremental)
+        count('triples', len(concept_map))
+
+    if pdf_bytes:
+        # Rank tokens extracted from the file text
+        progress('pdf_ranking')
+        with stage('pdf_ranking'):
+            ranked_tokens = rank_pdf(pdf_bytes)
+        count('ranked_tokens', len(ranked_tokens))
+        # Rank abstract concepts based on the resolved text and ranked tokens
+        progress('concept_ranking')
+        model = get_tfidf_model(TFIDF_MODEL_PATH) if TFIDF_MODEL_PATH else None
+        key = make_key('ranked_concepts', resolved_text, pdf_bytes, tfidf_model=model.digest if model else None,
+                       skip_layout=PDF_SKIP_LAYOUT)
+        with stage('concept_ranking'):
+            ranked_abstract_concepts = result_cache.get_or_compute(key, lambda: rank_abstract_concepts(resolved_text, ranked_tokens))
+        count('ranked_concepts', len(ranked_abstract_concepts))
+        # Filter the concept map based on the ranked abstract concepts
+        progress('filtering')
+        with stage('filtering'):
+            concept_map = filter_concept_map(concept_map, ranked_abstract_concepts, top_n, min_score)
+    return concept_map
+
+def generate_concept_graph(text, pdf_bytes=None, progress=None, layout_options=None, incremental=False, filter_options=None):
+    """
+    Run the whole pipeline, from the input text (and optional PDF) to the graph layout.
+
+    Args:
+        text (str): The input text.
+        pdf_bytes (bytes): Content of the PDF file of the paper, if any.
+        progress (callable): Called with the name of each stage (see STAGES) before it starts.
+        layout_options (dict): Keyword arguments passed to generate_layout.
+        incremental (bool): Whether to reuse the cached results of unchanged sentences.
+        filter_options (dict): Keyword arguments passed to build_concept_map (prune, top_n and min_score).
+
+    Returns:
+        tuple: The id of the graph and a dictionary containing nodes and edges
+               with their positions and labels.
+    """
+    if progress is None:
+        progress = lambda stage: None
+
+    concept_map = build_concept_map(text, pdf_bytes, progress, incremental, **(filter_options or {}))
+
+    # Generate a graph layout for the concept map
+    progress('layout')
+    with stage('layout'):
+        return layout_graph(concept_map, layout_options)
+
+def stream_concept_graph(text, layout_options=None, window=STREAM_WINDOW_SENTENCES, layout_interval=STREAM_LAYOUT_INTERVAL):
+    """
+    Run the pipeline on a text a few sentences at a time, yielding results as they are ready.
+
+    Every window of sentences yields its triples. A provisional layout of the
+    triples found so far follows the first triples, and then at most every
+    layout_interval seconds. Each provisional layout is warm-started from the
+    previous one, so that nodes keep their place as the graph grows. The
+    final layout is warm-started from the last provisional one.
+
+    Args:
+        text (str): The input text.
+        layout_options (dict): Keyword arguments passed to generate_layout.
+        window (int): Number of sentences processed at a time.
+        layout_interval (float): Minimum number of seconds between provisional layouts.
+
+    Yields:
+        dict: Events of type 'triples' (with the sentence range and its triples),
+              'layout' (a provisional graph) and, at the end, 'graph' (the graph and its id).
+    """
+    layout_options = dict(layout_options or {})
+    concept_map = []
+    last_layout = None
+    overlap = min(STREAM_WINDOW_OVERLAP, window - 1)
+    # Windows are cached by their content, so streaming the same text again skips the NLP
+    for start, end, _, triples in iter_concept_link_concept_pairs(text, window, overlap, result_cache):
+        concept_map.extend(triples)
+        yield {'type': 'triples', 'sentences': [start, end], 'triples': triples}
+        if triples and (last_layout is None or time.perf_counter() - last_layout >= layout_interval):
+            graph = generate_layout(concept_map, **layout_options)
+            # The following layouts keep the nodes of this one in place
+            layout_options.update(previous_positions=get_positions(graph), warm_start='fixed')
+            last_layout = time.perf_counter()
+            yield {'type': 'layout', 'graph': graph}
+
+    graph_id, graph = layout_graph(concept_map, layout_options)
+    yield {'type': 'graph', 'graph_id': graph_id, 'graph': graph}
@@ -1,34 +1,274 @@
 # For extracting text from PDF files
 import fitz
+# For extracting page ranges of PDF files in parallel
+import multiprocessing
 # For handling punctuation
 import string
 # For regular expressions
 import re
-# For natural language processing
-import spacy
-# For removing stopwords
-from nltk.corpus import stopwords
-# For lemmatizing words
-from nltk.stem import WordNetLemmatizer
+# For counting repeated noun phrases and bounding the page ranges waiting to be read
+from collections import Counter, deque
+# For computing TF-IDF scores from counted noun phrases
+import numpy as np
+# For counting the words of the noun phrases
+from sklearn.feature_extraction.text import CountVectorizer
+# Splits noun phrases into words in the same way as the vectorizers
+from tfidf import analyze
+# Shared spacy models and NLTK resources, loaded once per process
+from models import get_pipeline, get_stop_words, get_lemmatizer
 # For calculating TF-IDF scores
 from sklearn.feature_extraction.text import TfidfVectorizer
 
-def extract_text_from_pdf(pdf_path):
+# Maximum number of characters passed to spacy at once when ranking long documents
+MAX_CHUNK_CHARS = 100000
+
+# Minimum number of pages extracted by one process, below which a pool is not worth starting
+MIN_PAGES_PER_PROCESS = 16
+# Number of lines at the top and bottom of a page searched for running headers and footers
+LAYOUT_EDGE_LINES = 3
+# Share of the pages a line must be repeated on to count as a running header or footer
+LAYOUT_REPEAT_SHARE = 0.5
+# Headings of the reference section, which is cut up to the next appendix, if any
+REFERENCES_HEADING = re.compile(r'^\s*(?:\d+\.?\s*)?(?:references|bibliography|works cited|literature cited)\s*$', re.I)
+APPENDIX_HEADING = re.compile(r'^\s*(?:[A-Z]\.?\s+)?(?:appendix|appendices)\b', re.I)
+
+def open_pdf(source):
+    """
+    Open a PDF document from a path, bytes or a file-like object.
+
+    Args:
+        source (str, bytes or file): Path to the PDF file, its content, or a stream
+                                     such as an uploaded file.
+
+    Returns:
+        Document: The opened PDF document.
+    """
+    if isinstance(source, str):
+        return fitz.open(source)
+    if not isinstance(source, (bytes, bytearray)):
+        source = source.read()
+    return fitz.open(stream=source, filetype='pdf')
+
+def iter_pdf_pages(source, n_process=1):
+    """
+    Extract text from a PDF file, one page at a time.
+
+    With more than one process, ranges of MIN_PAGES_PER_PROCESS pages are
+    extracted in parallel, with at most one range per process waiting to be
+    read, so that the text of the whole file is never held at once.
+
+    Args:
+        source (str, bytes or file): Path to the PDF file, its content, or a stream.
+        n_process (int): Maximum number of processes. Every process extracts at least
+                         MIN_PAGES_PER_PROCESS pages.
+
+    Yields:
+        str: Extracted text of each page.
+    """
+    if n_process > 1:
+        # Processes open the document from its content
+        if isinstance(source, str):
+            with open(source, 'rb') as f:
+                source = f.read()
+        elif not isinstance(source, (bytes, bytearray)):
+            source = source.read()
+    doc = open_pdf(source)
+    n_pages = len(doc)
+    n_process = max(1, min(n_process, n_pages // MIN_PAGES_PER_PROCESS))
+    if n_process == 1:
+        try:
+            for page_num in range(n_pages):
+                page = doc.load_page(page_num)
+                yield page.get_text()
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    ranges = split_page_ranges(n_pages, -(-n_pages // MIN_PAGES_PER_PROCESS))
+    with multiprocessing.Pool(n_process) as pool:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.apply_async(_extract_page_range, ((source, start, end),)))
+            if len(pending) > n_process:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+
+def split_page_ranges(n_pages, n_ranges):
+    """
+    Split the pages of a document into contiguous ranges of about the same size.
+
+    Args:
+        n_pages (int): Number of pages.
+        n_ranges (int): Number of ranges.
+
+    Returns:
+        list: (start, end) tuples, end excluded, in page order.
+    """
+    size = -(-n_pages // max(1, n_ranges)) if n_pages else 1
+    return [(start, min(start + size, n_pages)) for start in range(0, n_pages, size)]
+
+def _extract_page_range(args):
+    # Unpack the arguments, since Pool.map passes a single argument.
+    # Every process opens its own document, since documents cannot be shared between processes
+    pdf_bytes, start, end = args
+    doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+    try:
+        return [doc.load_page(page_num).get_text() for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+def extract_pdf_pages(source, n_process=1):
+    """
+    Extract the text of every page of a PDF file, spreading page ranges across processes.
+
+    Args:
+        source (str, bytes or file): Path to the PDF file, its content, or a stream.
+        n_process (int): Maximum number of processes (see iter_pdf_pages).
+
+    Returns:
+        list: Extracted text of each page.
+    """
+    return list(iter_pdf_pages(source, n_process))
+
+def _layout_key(line):
+    # Running headers and footers often differ only by the page number
+    return re.sub(r'\d+', '#', line.strip().lower())
+
+def _edge_lines(lines):
+    # Indexes of the first and last lines with content of a page
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    return set(content[:LAYOUT_EDGE_LINES] + content[-LAYOUT_EDGE_LINES:])
+
+def find_layout(pages):
+    """
+    Find the running headers and footers, and the reference section, of page texts.
+
+    A line near the top or bottom of a page is a running header or footer if
+    the same line, with numbers ignored, is near the top or bottom of at least
+    LAYOUT_REPEAT_SHARE of the pages. The reference section starts at the last
+    references heading in the second half of the document. Only the lines near
+    the edges and the headings are kept while the pages are read.
+
+    Args:
+        pages (iterable): Texts of the pages.
+
+    Returns:
+        tuple: The set of layout keys of the headers and footers, and the
+               (page, line) position of the references heading, or None.
+    """
+    repeats = Counter()
+    headings = []
+    n_pages = 0
+    for page_num, page in enumerate(pages):
+        lines = page.splitlines()
+        edges = _edge_lines(lines)
+        repeats.update({_layout_key(lines[i]) for i in edges})
+        headings.extend((page_num, i, _layout_key(line) if i in edges else None)
+                        for i, line in enumerate(lines) if REFERENCES_HEADING.match(line))
+        n_pages = page_num + 1
+    min_repeats = max(2, LAYOUT_REPEAT_SHARE * n_pages)
+    layout_keys = {key for key, n in repeats.items() if n >= min_repeats}
+
+    # Find the last references heading past the middle of the document, which is not itself a header or footer
+    references = None
+    for page_num, i, key in headings:
+        if page_num >= n_pages // 2 and key not in layout_keys:
+            references = (page_num, i)
+    return layout_keys, references
+
+def iter_without_layout_lines(pages, layout_keys, references):
+    """
+    Remove running headers, footers and page numbers, and the reference section, from page texts.
+
+    The reference section ends at the next appendix heading or the end of the document.
+
+    Args:
+        pages (iterable): Texts of the pages.
+        layout_keys (set): Layout keys of the headers and footers (see find_layout).
+        references (tuple): (page, line) position of the references heading, or None.
+
+    Yields:
+        str: The cleaned text of each page.
+    """
+    in_references = False
+    for page_num, page in enumerate(pages):
+        lines = page.splitlines()
+        layout = {i for i in _edge_lines(lines) if _layout_key(lines[i]) in layout_keys or lines[i].strip().isdigit()}
+        kept = []
+        for i, line in enumerate(lines):
+            if i in layout:
+                continue
+            if (page_num, i) == references:
+                in_references = True
+            elif in_references and APPENDIX_HEADING.match(line):
+                in_references = False
+            if not in_references:
+                kept.append(line)
+        yield ''.join(line + '\n' for line in kept)
+
+def remove_layout_lines(pages):
+    """
+    Remove running headers, footers and page numbers, and the reference section, from page texts.
+
+    Args:
+        pages (list): Texts of the pages.
+
+    Returns:
+        list: The cleaned texts of the pages.
+    """
+    return list(iter_without_layout_lines(pages, *find_layout(pages)))
+
+def extract_text_from_pdf(pdf_path, n_process=1, skip_layout=False):
     """
     Extract text from a PDF file.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path (str, bytes or file): Path to the PDF file, its content, or a stream.
+        n_process (int): Maximum number of processes extracting page ranges.
+        skip_layout (bool): Whether to remove running headers, footers and the
+                            reference section (see remove_layout_lines).
 
     Returns:
         str: Extracted text from the PDF.
     """
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        text += page.get_text()
-    return text
+    pages = extract_pdf_pages(pdf_path, n_process)
+    if skip_layout:
+        pages = remove_layout_lines(pages)
+    return ''.join(pages)
+
+def iter_text_chunks(pages, max_chars=MAX_CHUNK_CHARS):
+    """
+    Group page texts into chunks of at most max_chars characters.
+
+    Pages are kept whole when possible. A page longer than max_chars is split
+    at the last whitespace before the limit.
+
+    Args:
+        pages (iterable): Texts of the pages.
+        max_chars (int): Maximum number of characters in a chunk.
+
+    Yields:
+        str: The text chunks.
+    """
+    chunk = []
+    size = 0
+    for page in pages:
+        if size + len(page) > max_chars and chunk:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+        while len(page) > max_chars:
+            split = page.rfind(' ', 0, max_chars)
+            if split <= 0:
+                split = max_chars
+            yield page[:split]
+            page = page[split:]
+        chunk.append(page)
+        size += len(page)
+    if chunk:
+        yield ''.join(chunk)
 
 def extract_noun_phrases(text):
     """
@@ -40,13 +280,20 @@ def extract_noun_phrases(text):
     Returns:
         list: A list of noun phrases.
     """
-    # Load the spacy model
-    nlp = spacy.load('en_core_web_sm')
     # Apply the NLP pipeline
-    doc = nlp(text)
-    # Extract noun phrases
-    noun_phrases = [chunk.text.lower() for chunk in doc.noun_chunks]
-    return noun_phrases
+    return extract_noun_phrases_from_doc(get_pipeline('ranking')(text))
+
+def extract_noun_phrases_from_doc(doc):
+    """
+    Extract noun phrases from a parsed document.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+
+    Returns:
+        list: A list of noun phrases.
+    """
+    return [chunk.text.lower() for chunk in doc.noun_chunks]
 
 def clean_noun_phrases(noun_phrases):
     """
@@ -77,10 +324,10 @@ def preprocess_noun_phrases(noun_phrases):
     Returns:
         list: Preprocessed noun phrases.
     """
-    # Load English stopwords
-    stop_words = set(stopwords.words('english'))
-    # Initialize the lemmatizer
-    lemmatizer = WordNetLemmatizer()
+    # Get the English stopwords
+    stop_words = get_stop_words()
+    # Get the lemmatizer
+    lemmatizer = get_lemmatizer()
     processed_phrases = []
     for phrase in noun_phrases:
         # Split the phrase into words
@@ -113,6 +360,97 @@ def rank_words_tfidf(noun_phrases):
     # top_concepts = sorted(tfidf_scores.items(), key=lambda x: x[1], reverse=True)
     return tfidf_scores
 
+def rank_words_tfidf_counts(phrase_counts, model=None):
+    """
+    Rank words using TF-IDF scores, given how many times each noun phrase occurs.
+
+    This gives the same scores as rank_words_tfidf on the list in which every
+    phrase is repeated as many times as it was counted, without keeping that list.
+    With a corpus model, the IDF weights come from the reference corpus instead
+    of from the phrases themselves.
+
+    Args:
+        phrase_counts (Counter): Noun phrases and their number of occurrences.
+        model (TfidfModel): Document frequencies of a reference corpus, if any.
+
+    Returns:
+        dict: Dictionary of words and their TF-IDF scores.
+    """
+    # Count the words of each distinct phrase with the analyzer of the vectorizers, so no vectorizer is fitted
+    phrase_words = [(Counter(analyze(phrase)), count) for phrase, count in phrase_counts.items()]
+    words = sorted({word for counts, _ in phrase_words for word in counts})
+    if model is not None:
+        idf = model.idf(words)
+    else:
+        # Document frequencies and smoothed IDF, as computed by TfidfVectorizer
+        n_documents = sum(phrase_counts.values())
+        document_frequency = Counter()
+        for counts, count in phrase_words:
+            for word in counts:
+                document_frequency[word] += count
+        idf = np.log((1 + n_documents) / (1 + np.array([document_frequency[word] for word in words], dtype=np.float64))) + 1
+    idf = dict(zip(words, idf))
+    # Weight the counts by IDF, normalize each phrase to unit length and sum the
+    # scores of each word over all occurrences of every phrase
+    scores = dict.fromkeys(words, 0.0)
+    for counts, count in phrase_words:
+        weighted = {word: n * idf[word] for word, n in counts.items()}
+        norm = np.sqrt(sum(weight * weight for weight in weighted.values())) or 1
+        for word, weight in weighted.items():
+            scores[word] += count * weight / norm
+    return scores
+
+def count_noun_phrases(chunks, batch_size=4):
+    """
+    Count the preprocessed noun phrases of a long document given as text chunks.
+
+    Chunks are parsed one batch at a time and only the counts are kept, so
+    memory does not grow with the length of the document.
+
+    Args:
+        chunks (iterable): Text chunks of the document.
+        batch_size (int): Number of chunks buffered by spacy.
+
+    Returns:
+        Counter: Preprocessed noun phrases and their number of occurrences.
+    """
+    phrase_counts = Counter()
+    for doc in get_pipeline('ranking').pipe(chunks, batch_size=batch_size):
+        # Extract, clean and preprocess the noun phrases of the chunk
+        noun_phrases = [chunk.text.lower() for chunk in doc.noun_chunks]
+        phrase_counts.update(preprocess_noun_phrases(clean_noun_phrases(noun_phrases)))
+    return phrase_counts
+
+def rank_tokens_from_chunks(chunks, batch_size=4, model=None):
+    """
+    Rank tokens of a long document given as text chunks.
+
+    Args:
+        chunks (iterable): Text chunks of the document.
+        batch_size (int): Number of chunks buffered by spacy.
+        model (TfidfModel): Document frequencies of a reference corpus, if any.
+
+    Returns:
+        dict: Dictionary of tokens and their TF-IDF scores.
+    """
+    phrase_counts = count_noun_phrases(chunks, batch_size)
+    if not phrase_counts:
+        return {}
+    return rank_words_tfidf_counts(phrase_counts, model)
+
+def rank_pdf_tokens(source, model=None):
+    """
+    Rank tokens of a PDF file, streaming its text page by page.
+
+    Args:
+        source (str, bytes or file): Path to the PDF file, its content, or a stream.
+        model (TfidfModel): Document frequencies of a reference corpus, if any.
+
+    Returns:
+        dict: Dictionary of tokens and their TF-IDF scores.
+    """
+    return rank_tokens_from_chunks(iter_text_chunks(iter_pdf_pages(source)), model=model)
+
 def rank_tokens(text):
     """
     Rank tokens in the text based on their TF-IDF scores.
@@ -141,18 +479,29 @@ def rank_abstract_concepts(text, ranked_tokens):
         text (str): The input text.
         ranked_tokens (dict): Dictionary of tokens and their TF-IDF scores.
 
+    Returns:
+        list: Ranked abstract concepts with their scores.
+    """
+    return rank_abstract_concepts_from_doc(get_pipeline('ranking')(text), ranked_tokens)
+
+def rank_abstract_concepts_from_doc(doc, ranked_tokens):
+    """
+    Rank abstract concepts of a parsed document, e.g. the one concepts are extracted from.
+
+    Args:
+        doc (Doc): The parsed spacy document.
+        ranked_tokens (dict): Dictionary of tokens and their TF-IDF scores.
+
     Returns:
         list: Ranked abstract concepts with their scores.
     """
     # Extract noun phrases
-    noun_phrases = extract_noun_phrases(text)
+    noun_phrases = extract_noun_phrases_from_doc(doc)
     # Preprocess the noun phrases
     preprocessed_noun_phrases = preprocess_noun_phrases(noun_phrases)
-    concept_scores = {}
-    for i in range(len(preprocessed_noun_phrases)):
-        # Compute the score for each concept
-        score = compute_concept_score(preprocessed_noun_phrases[i].split(), ranked_tokens)
-        concept_scores[noun_phrases[i]] = score
+    # Compute the score of every concept at once
+    scores = score_concepts(preprocessed_noun_phrases, ranked_tokens)
+    concept_scores = dict(zip(noun_phrases, scores))
     # Sort concepts by score
     ranked_concepts = sorted(concept_scores.items(), key=lambda x: x[1], reverse=True)
     return ranked_concepts
@@ -168,35 +517,61 @@ def compute_concept_score(tokens, tfidf_scores):
     Returns:
         float: The highest TF-IDF score among the tokens.
     """
-    max = 0
-    for token in tokens:
-        try:
-            # Get the TF-IDF score for the token
-            score = tfidf_scores[token]
-            if score > max:
-                # Update the maximum score
-                max = score
-        except:
-            pass # Ignore tokens not in the TF-IDF dictionary
-    return max
+    # Tokens not in the TF-IDF dictionary score 0
+    return max([tfidf_scores.get(token, 0) for token in tokens], default=0)
+
+def score_concepts(phrases, tfidf_scores):
+    """
+    Compute the scores of many concepts at once, as compute_concept_score does for one.
 
-def filter_concept_map(concept_map, ranked_concepts, top_n=15):
+    Args:
+        phrases (list): Preprocessed phrases of the concepts, with tokens separated by spaces.
+        tfidf_scores (dict): Dictionary of tokens and their TF-IDF scores.
+
+    Returns:
+        list: The highest TF-IDF score among the tokens of every phrase.
+    """
+    if not phrases or not tfidf_scores:
+        return [0] * len(phrases)
+    tokens = list(tfidf_scores)
+    # Sparse matrix of which known tokens every phrase contains
+    vectorizer = CountVectorizer(analyzer=str.split, vocabulary=tokens, binary=True)
+    contains = vectorizer.transform(phrases).tocsr()
+    # Scores are not negative, so the maximum of a row is 0 when no token is known
+    scores = contains.multiply(np.array([tfidf_scores[token] for token in tokens])).tocsr().max(axis=1)
+    return scores.toarray().ravel().tolist()
+
+def select_top_concepts(ranked_concepts, top_n=15, min_score=None):
+    """
+    Select the top-ranked concepts.
+
+    Args:
+        ranked_concepts (list): List of ranked concepts with their scores.
+        top_n (int): Number of top concepts to include, or None for all of them.
+        min_score (float): Minimum score of the included concepts, if any.
+
+    Returns:
+        set: The selected concepts.
+    """
+    # Get the top N concepts
+    top_concepts = ranked_concepts[:top_n] if top_n is not None else ranked_concepts
+    return {concept for concept, score in top_concepts if min_score is None or score >= min_score}
+
+def filter_concept_map(concept_map, ranked_concepts, top_n=15, min_score=None):
     """
     Filter the concept map to include only the top-ranked concepts.
 
     Args:
         concept_map (list): List of concept-relation-concept tuples.
         ranked_concepts (list): List of ranked concepts with their scores.
-        top_n (int): Number of top concepts to include.
+        top_n (int): Number of top concepts to include, or None for all of them.
+        min_score (float): Minimum score of the included concepts, if any.
 
     Returns:
         list: Filtered concept map.
     """
     new_map = []
-    # Get the top N concepts
-    top_concepts = [concept[0] for concept in ranked_concepts][:top_n]
-    # top_concepts = ranked_concepts[:top_n]
-    print(top_concepts)
+    top_concepts = select_top_concepts(ranked_concepts, top_n, min_score)
     for concept1, link, concept2 in concept_map:
         if concept1 in top_concepts and concept2 in top_concepts: # Include only top-ranked concepts
             new_map.append((concept1, link, concept2))
@@ -0,0 +1,250 @@
+# For serializing the relations of edges
+import json
+# For the embedded database
+import sqlite3
+# For guarding the connection against concurrent requests
+import threading
+# For the creation time of maps
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS maps (
+    map_id INTEGER PRIMARY KEY,
+    graph_id TEXT UNIQUE,
+    created REAL NOT NULL,
+    node_count INTEGER NOT NULL,
+    edge_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    map_id INTEGER NOT NULL REFERENCES maps (map_id) ON DELETE CASCADE,
+    node_id INTEGER NOT NULL,
+    concept TEXT NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    degree INTEGER NOT NULL,
+    PRIMARY KEY (map_id, node_id)
+);
+CREATE INDEX IF NOT EXISTS nodes_concept ON nodes (map_id, concept);
+CREATE INDEX IF NOT EXISTS nodes_degree ON nodes (map_id, degree DESC);
+CREATE TABLE IF NOT EXISTS edges (
+    map_id INTEGER NOT NULL REFERENCES maps (map_id) ON DELETE CASCADE,
+    edge_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    source INTEGER NOT NULL,
+    target INTEGER NOT NULL,
+    relation TEXT NOT NULL,
+    relations TEXT,
+    PRIMARY KEY (map_id, edge_id)
+);
+CREATE INDEX IF NOT EXISTS edges_source ON edges (map_id, source);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (map_id, target);
+CREATE INDEX IF NOT EXISTS edges_relation ON edges (map_id, relation);
+'''
+
+class GraphStore:
+    """
+    Generated graphs saved in an SQLite database, with queries for parts of them.
+
+    Nodes and edges are stored in their own tables, indexed by concept,
+    relation and degree, so that parts of a large map can be loaded without
+    reading or laying out the whole map again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def save_graph(self, graph, graph_id=None):
+        """
+        Save a graph returned by generate_layout.
+
+        Args:
+            graph (dict): A dictionary containing nodes and edges.
+            graph_id (str): The id of the graph, if any. A graph saved before with the
+                            same id is not saved again.
+
+        Returns:
+            int: The id of the saved map.
+        """
+        node_ids = {node['id']: i for i, node in enumerate(graph['nodes'])}
+        degrees = [0] * len(node_ids)
+        edges = []
+        for i, edge in enumerate(graph['edges']):
+            source, target = node_ids[edge['source']], node_ids[edge['target']]
+            degrees[source] += 1
+            degrees[target] += 1
+            relations = edge.get('data', {}).get('relations')
+            edges.append((i, edge['id'], source, target, edge['label'], json.dumps(relations) if relations is not None else None))
+
+        with self._lock, self._connection:
+            if graph_id is not None:
+                row = self._connection.execute('SELECT map_id FROM maps WHERE graph_id = ?', (graph_id,)).fetchone()
+                if row:
+                    return row[0]
+            map_id = self._connection.execute(
+                'INSERT INTO maps (graph_id, created, node_count, edge_count) VALUES (?, ?, ?, ?)',
+                (graph_id, time.time(), len(node_ids), len(edges))).lastrowid
+            self._connection.executemany(
+                'INSERT INTO nodes (map_id, node_id, concept, x, y, degree) VALUES (?, ?, ?, ?, ?, ?)',
+                ((map_id, i, node['id'], node['position']['x'], node['position']['y'], degrees[i])
+                 for i, node in enumerate(graph['nodes'])))
+            self._connection.executemany(
+                'INSERT INTO edges (map_id, edge_id, key, source, target, relation, relations) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((map_id,) + edge for edge in edges))
+        return map_id
+
+    def get_map(self, map_id):
+        """
+        Get the description of a saved map.
+
+        Args:
+            map_id (int): The id of the map.
+
+        Returns:
+            dict: The map id, graph id, creation time and sizes, or None if the map does not exist.
+        """
+        rows = self._query('SELECT map_id, graph_id, created, node_count, edge_count FROM maps WHERE map_id = ?', (map_id,))
+        if not rows:
+            return None
+        return dict(zip(('map_id', 'graph_id', 'created', 'node_count', 'edge_count'), rows[0]))
+
+    def delete_map(self, map_id):
+        """
+        Delete a saved map.
+
+        Args:
+            map_id (int): The id of the map.
+
+        Returns:
+            bool: False if the map does not exist.
+        """
+        with self._lock, self._connection:
+            return self._connection.execute('DELETE FROM maps WHERE map_id = ?', (map_id,)).rowcount > 0
+
+    def nodes(self, map_id, offset=0, limit=100):
+        """
+        List the nodes of a map, in the order of the graph.
+
+        Args:
+            map_id (int): The id of the map.
+            offset (int): Number of nodes to skip.
+            limit (int): Maximum number of nodes.
+
+        Returns:
+            list: The nodes, as returned by generate_layout, with their degree.
+        """
+        rows = self._query('SELECT concept, x, y, degree FROM nodes WHERE map_id = ? ORDER BY node_id LIMIT ? OFFSET ?',
+                           (map_id, limit, offset))
+        return [_node(*row) for row in rows]
+
+    def edges(self, map_id, offset=0, limit=100, relation=None):
+        """
+        List the edges of a map, in the order of the graph.
+
+        Args:
+            map_id (int): The id of the map.
+            offset (int): Number of edges to skip.
+            limit (int): Maximum number of edges.
+            relation (str): If given, only edges labelled with this relation are listed.
+
+        Returns:
+            list: The edges, as returned by generate_layout.
+        """
+        sql = ('SELECT e.key, s.concept, t.concept, e.relation, e.relations FROM edges e '
+               'JOIN nodes s ON s.map_id = e.map_id AND s.node_id = e.source '
+               'JOIN nodes t ON t.map_id = e.map_id AND t.node_id = e.target WHERE e.map_id = ?')
+        parameters = [map_id]
+        if relation is not None:
+            sql += ' AND e.relation = ?'
+            parameters.append(relation)
+        sql += ' ORDER BY e.edge_id LIMIT ? OFFSET ?'
+        return [_edge(*row) for row in self._query(sql, parameters + [limit, offset])]
+
+    def top_nodes(self, map_id, limit=20):
+        """
+        List the nodes of a map with the most edges.
+
+        Args:
+            map_id (int): The id of the map.
+            limit (int): Maximum number of nodes.
+
+        Returns:
+            list: The nodes, by decreasing degree, with their degree.
+        """
+        rows = self._query('SELECT concept, x, y, degree FROM nodes WHERE map_id = ? ORDER BY degree DESC, node_id LIMIT ?',
+                           (map_id, limit))
+        return [_node(*row) for row in rows]
+
+    def neighbourhood(self, map_id, concept, hops=1, limit=1000):
+        """
+        Get the part of a map within some hops of a concept.
+
+        Args:
+            map_id (int): The id of the map.
+            concept (str): The concept at the center.
+            hops (int): Maximum number of edges between the concept and the included nodes.
+            limit (int): Maximum number of nodes. The search stops at the hop which reaches it.
+
+        Returns:
+            dict: The nodes and edges of the neighbourhood, or None if the concept is not in the map.
+        """
+        row = self._query('SELECT node_id FROM nodes WHERE map_id = ? AND concept = ?', (map_id, concept))
+        if not row:
+            return None
+        found = {row[0][0]}
+        frontier = set(found)
+        for _ in range(hops):
+            if not frontier or len(found) >= limit:
+                break
+            reached = set()
+            for chunk in _chunks(frontier):
+                marks = ', '.join('?' * len(chunk))
+                rows = self._query(
+                    f'SELECT target FROM edges WHERE map_id = ? AND source IN ({marks}) '
+                    f'UNION SELECT source FROM edges WHERE map_id = ? AND target IN ({marks})',
+                    [map_id] + chunk + [map_id] + chunk)
+                reached.update(node for node, in rows)
+            reached = sorted(reached - found)
+            frontier = set(reached[:limit - len(found)])
+            found |= frontier
+
+        # Include every edge between the found nodes
+        nodes = []
+        edges = []
+        for chunk in _chunks(found):
+            marks = ', '.join('?' * len(chunk))
+            nodes += self._query(f'SELECT node_id, concept, x, y, degree FROM nodes WHERE map_id = ? AND node_id IN ({marks})',
+                                 [map_id] + chunk)
+            edges += self._query(
+                'SELECT e.edge_id, e.target, e.key, s.concept, t.concept, e.relation, e.relations FROM edges e '
+                'JOIN nodes s ON s.map_id = e.map_id AND s.node_id = e.source '
+                'JOIN nodes t ON t.map_id = e.map_id AND t.node_id = e.target '
+                f'WHERE e.map_id = ? AND e.source IN ({marks})', [map_id] + chunk)
+        nodes = [row[1:] for row in sorted(nodes)]
+        edges = [row[2:] for row in sorted(edges) if row[1] in found]
+        return {'nodes': [_node(*row) for row in nodes], 'edges': [_edge(*row) for row in edges]}
+
+def _chunks(node_ids, size=500):
+    # Node ids in lists short enough to be query parameters
+    node_ids = sorted(node_ids)
+    return [node_ids[i:i + size] for i in range(0, len(node_ids), size)]
+
+def _node(concept, x, y, degree):
+    # A node in the format of generate_layout
+    return {'id': concept, 'data': {'label': concept, 'degree': degree}, 'position': {'x': x, 'y': y}}
+
+def _edge(key, source, target, relation, relations):
+    # An edge in the format of generate_layout
+    edge = {'id': key, 'source': source, 'target': target, 'label': relation}
+    if relations is not None:
+        edge['data'] = {'relations': json.loads(relations)}
+    edge['animated'] = 'true'
+    return edge
@@ -0,0 +1,5 @@
+# For importing the backend modules
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
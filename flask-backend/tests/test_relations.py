@@ -0,0 +1,111 @@
+"""
+Regression tests of the relation search and the verb phrase filter of logic.py.
+
+Both are compared with the quadratic and cubic implementations they replaced,
+on long generated run-on sentences. Costs are checked by counting operations
+rather than by timing, so that the tests do not depend on the machine.
+
+Usage:
+    python -m pytest tests
+"""
+# For generating sentences
+import random
+
+from logic import find_possible_relations, extract_verb_phrases_from_doc, get_verb_phrase_matcher, parse
+
+ADJECTIVES = ['semantic', 'structural', 'lexical', 'external', 'large', 'sparse', 'formal', 'neural']
+NOUNS = ['ontology', 'information', 'matching', 'graph', 'reasoner', 'dictionary', 'similarity', 'model']
+VERBS = ['describes', 'improves', 'uses', 'analyzes', 'combines', 'is based on', 'relies on', 'can be extended with']
+
+def reference_find_possible_relations(concepts, links):
+    # The implementation before the links were bisected, checking every link of every pair of concepts
+    relations = []
+    for sentence_concepts, sentence_links in zip(concepts, links):
+        sentence_relations = []
+        for i in range(len(sentence_concepts) - 1):
+            for j in range(i + 1, len(sentence_concepts)):
+                start1, end1, concept1 = sentence_concepts[i]
+                start2, end2, concept2 = sentence_concepts[j]
+                found = [link[2] for link in sentence_links if end1 <= link[0] and start2 >= link[1]]
+                if found:
+                    sentence_relations.append((concept1, concept2, found))
+        relations.append(sentence_relations)
+    return relations
+
+def reference_extract_verb_phrases_from_doc(doc):
+    # The implementation before the sweep line, checking every span against every accepted span
+    spans = [doc[start:end] for match_id, start, end in get_verb_phrase_matcher()(doc)]
+    spans = sorted(spans, key=lambda span: (span.start, -(span.end - span.start)))
+    filtered_spans = []
+    for span in spans:
+        if not any(span.start < accepted.end and span.end > accepted.start for accepted in filtered_spans):
+            filtered_spans.append(span)
+    verb_phrases = []
+    for sentence in doc.sents:
+        verb_phrases.append([(span.start, span.end, span.text) for span in filtered_spans
+                             if span.start >= sentence.start and span.end <= sentence.end])
+    return verb_phrases
+
+def generate_spans(rng, n_concepts, n_links):
+    """
+    Generate the concepts and links of a sentence as disjoint token spans, as extracted from a parse.
+    """
+    kinds = ['concept'] * n_concepts + ['link'] * n_links
+    rng.shuffle(kinds)
+    concepts = []
+    links = []
+    end = 0
+    for kind in kinds:
+        # Spans of a few tokens, some of them separated by other tokens
+        start = end + rng.randint(0, 2)
+        end = start + rng.randint(1, 4)
+        if kind == 'concept':
+            concepts.append((start, end, f'concept {start}'))
+        else:
+            links.append((start, end, f'link {start}'))
+    return concepts, links
+
+def generate_run_on_sentence(rng, clauses):
+    """
+    Generate a sentence of many clauses joined with commas.
+    """
+    phrase = lambda: f'the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'
+    clauses = [f'{phrase()} {rng.choice(VERBS)} {phrase()}' for _ in range(clauses)]
+    return 'The ' + ', and '.join(clauses)[4:] + '.'
+
+class CountingList(list):
+    """
+    A list which counts how many items are read by index.
+    """
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.reads = 0
+
+    def __getitem__(self, index):
+        self.reads += 1
+        return super().__getitem__(index)
+
+def test_find_possible_relations_matches_reference():
+    rng = random.Random(0)
+    for _ in range(300):
+        sentences = [generate_spans(rng, rng.randint(2, 60), rng.randint(1, 60)) for _ in range(3)]
+        concepts = [sentence_concepts for sentence_concepts, _ in sentences]
+        links = [sentence_links for _, sentence_links in sentences]
+        assert find_possible_relations(concepts, links) == reference_find_possible_relations(concepts, links)
+
+def test_find_possible_relations_scales_with_output():
+    # Concepts followed by links, so that no pair of concepts has a link between them: the
+    # reference checks every link of every pair, while the bisection finds no candidate at once
+    n = 1000
+    concepts = CountingList((i, i + 1, f'concept {i}') for i in range(n))
+    links = [(n + i, n + i + 1, f'link {i}') for i in range(n)]
+    assert find_possible_relations([concepts], [links]) == [[]]
+    # Every concept is read once as the first of a pair, and no second concept is read
+    assert concepts.reads < 2 * n
+
+def test_verb_phrase_filter_matches_reference():
+    rng = random.Random(0)
+    for clauses in (5, 50, 200, 400):
+        doc = parse(generate_run_on_sentence(rng, clauses) + ' ' + generate_run_on_sentence(rng, clauses))
+        assert extract_verb_phrases_from_doc(doc) == reference_extract_verb_phrases_from_doc(doc)
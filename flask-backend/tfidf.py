@@ -0,0 +1,118 @@
+# For hashing the saved model
+import hashlib
+# For saving and loading the model
+import json
+# For file and directory operations
+import os
+# For writing the saved model atomically
+import tempfile
+# For guarding the loaded models against concurrent requests
+import threading
+# For computing the IDF weights
+import numpy as np
+# For splitting noun phrases into words
+from sklearn.feature_extraction.text import CountVectorizer
+
+# Splits text into words in the same way as the vectorizers used for ranking
+analyze = CountVectorizer().build_analyzer()
+
+class TfidfModel:
+    """
+    Document frequencies of words over a reference corpus of papers.
+
+    The model only stores how many documents contain each word, so it can be
+    updated with new documents at any time. The IDF weights are smoothed in
+    the same way as TfidfVectorizer, and words which are not in the corpus
+    get the weight of a word that is in no document.
+    """
+
+    def __init__(self, document_frequency=None, n_documents=0, digest=None):
+        self.document_frequency = dict(document_frequency or {})
+        self.n_documents = n_documents
+        # Hash of the saved model, used to tell models apart in cache keys
+        self.digest = digest
+
+    def update(self, documents):
+        """
+        Add documents to the corpus.
+
+        Args:
+            documents (iterable): The documents, each given as an iterable of noun phrases.
+        """
+        for phrases in documents:
+            words = set()
+            for phrase in phrases:
+                words.update(analyze(phrase))
+            for word in words:
+                self.document_frequency[word] = self.document_frequency.get(word, 0) + 1
+            self.n_documents += 1
+        self.digest = None
+
+    def idf(self, words):
+        """
+        Get the IDF weights of words.
+
+        Args:
+            words (list): The words.
+
+        Returns:
+            ndarray: The IDF weight of every word.
+        """
+        document_frequency = np.array([self.document_frequency.get(word, 0) for word in words], dtype=np.float64)
+        return np.log((1 + self.n_documents) / (1 + document_frequency)) + 1
+
+    def save(self, path):
+        """
+        Save the model as JSON.
+
+        Args:
+            path (str): Path of the model file.
+        """
+        data = json.dumps({'n_documents': self.n_documents, 'document_frequency': self.document_frequency}, sort_keys=True)
+        # Write to a temporary file first so that running servers never load a partial model
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.digest = hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model saved with save.
+
+        Args:
+            path (str): Path of the model file.
+
+        Returns:
+            TfidfModel: The loaded model.
+        """
+        with open(path, encoding='utf-8') as f:
+            data = f.read()
+        model = json.loads(data)
+        return cls(model['document_frequency'], model['n_documents'], hashlib.sha256(data.encode('utf-8')).hexdigest())
+
+# Loaded models by path, with the modification time and size of their file
+_models = {}
+_models_lock = threading.Lock()
+
+def get_tfidf_model(path):
+    """
+    Load a model once per process, and again whenever its file changes.
+
+    Models are saved by replacing their file, so a model rebuilt with
+    build_tfidf_model.py is picked up by running servers on the next call.
+
+    Args:
+        path (str): Path of the model file.
+
+    Returns:
+        TfidfModel: The shared model.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _models_lock:
+        loaded = _models.get(path)
+        if loaded is None or loaded[0] != version:
+            loaded = _models[path] = (version, TfidfModel.load(path))
+        return loaded[1]
@@ -0,0 +1,160 @@
+# For packing the node positions
+import base64
+# For compressing responses
+import gzip
+# For serializing responses
+import json
+# For the layout of the packed positions
+import numpy as np
+
+# Optional binary encoding of the compact format
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Optional compression, usually better than gzip for JSON
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Media types of the wire formats. The React Flow JSON returned by generate_layout is the default
+JSON = 'application/json'
+COMPACT_JSON = 'application/vnd.concept-map.compact+json'
+COMPACT_MSGPACK = 'application/vnd.concept-map.compact+msgpack'
+
+# Version of the compact format, sent with every compact graph
+COMPACT_VERSION = 1
+
+# Responses smaller than this are not compressed
+MIN_COMPRESS_BYTES = 1024
+
+def media_types():
+    """
+    List the media types that can be sent, the default first.
+
+    Returns:
+        list: The media types.
+    """
+    return [JSON, COMPACT_JSON] + ([COMPACT_MSGPACK] if msgpack is not None else [])
+
+def encodings():
+    """
+    List the content encodings that can be sent, the preferred first.
+
+    Returns:
+        list: The content encodings.
+    """
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+def to_compact(graph, binary=False):
+    """
+    Convert a graph returned by generate_layout to the compact format.
+
+    Every concept and relation is stored once in a string table and referred
+    to by its index. The node positions are packed as little-endian float32
+    pairs, base64-encoded unless binary is True. Edges are a flat list of
+    source and target node indices, with the relations of every edge.
+    Repeated fields, such as labels, edge ids and 'animated', are left out.
+
+    Args:
+        graph (dict): A dictionary containing nodes and edges.
+        binary (bool): Whether the positions are kept as bytes, for binary encodings.
+
+    Returns:
+        dict: The compact graph.
+    """
+    strings = []
+    string_ids = {}
+
+    def ref(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    nodes = graph['nodes']
+    node_ids = {node['id']: i for i, node in enumerate(nodes)}
+    positions = np.array([(node['position']['x'], node['position']['y']) for node in nodes], dtype='<f4').tobytes()
+    edges = []
+    relations = []
+    # Edges of multigraphs have a single relation and no 'data'
+    multi = any('data' not in edge for edge in graph['edges'])
+    for edge in graph['edges']:
+        edges += [node_ids[edge['source']], node_ids[edge['target']]]
+        relations.append([ref(relation) for relation in edge.get('data', {}).get('relations', [edge['label']])])
+    return {
+        'version': COMPACT_VERSION,
+        'strings': strings,
+        'nodes': [ref(node['id']) for node in nodes],
+        'positions': positions if binary else base64.b64encode(positions).decode('ascii'),
+        'edges': edges,
+        'relations': relations,
+        'multi': multi,
+    }
+
+def from_compact(compact):
+    """
+    Convert a compact graph back to the format returned by generate_layout.
+
+    Args:
+        compact (dict): The compact graph.
+
+    Returns:
+        dict: A dictionary containing nodes and edges.
+    """
+    strings = compact['strings']
+    positions = compact['positions']
+    if isinstance(positions, str):
+        positions = base64.b64decode(positions)
+    positions = np.frombuffer(positions, dtype='<f4').reshape(-1, 2).tolist()
+    node_names = [strings[i] for i in compact['nodes']]
+    nodes = [{'id': name, 'data': {'label': name}, 'position': {'x': x, 'y': y}}
+             for name, (x, y) in zip(node_names, positions)]
+    edges = []
+    for i, relation_ids in enumerate(compact['relations']):
+        source = node_names[compact['edges'][2 * i]]
+        target = node_names[compact['edges'][2 * i + 1]]
+        relations = [strings[j] for j in relation_ids]
+        if compact.get('multi'):
+            edges.append({'id': f'{source}-{target}-{relations[0]}', 'source': source, 'target': target,
+                          'label': relations[0], 'animated': 'true'})
+        else:
+            edges.append({'id': f'{source}-{target}', 'source': source, 'target': target, 'label': relations[0],
+                          'data': {'relations': relations}, 'animated': 'true'})
+    return {'nodes': nodes, 'edges': edges}
+
+def encode(body, media_type=JSON, encoding=None):
+    """
+    Encode a response body containing graphs in a wire format.
+
+    The graphs under 'graph' and 'graphs' are converted to the compact format,
+    unless the media type is plain JSON.
+
+    Args:
+        body (dict): The response body.
+        media_type (str): One of the media types of media_types().
+        encoding (str): 'br', 'gzip' or None.
+
+    Returns:
+        tuple: The encoded body and the response headers.
+    """
+    if media_type != JSON:
+        binary = media_type == COMPACT_MSGPACK
+        body = dict(body)
+        if body.get('graph') is not None:
+            body['graph'] = to_compact(body['graph'], binary)
+        if body.get('graphs') is not None:
+            body['graphs'] = [to_compact(graph, binary) for graph in body['graphs']]
+
+    if media_type == COMPACT_MSGPACK:
+        data = msgpack.packb(body, use_bin_type=True)
+    else:
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+    headers = {'Content-Type': media_type, 'Vary': 'Accept, Accept-Encoding'}
+    if encoding and len(data) >= MIN_COMPRESS_BYTES:
+        data = brotli.compress(data) if encoding == 'br' else gzip.compress(data, compresslevel=6)
+        headers['Content-Encoding'] = encoding
+    return data, headers